@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.warnings_config # Import this first to silence warnings
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, PlainTextResponse, StreamingResponse
+from app.database import get_session_factory
+from app.models import Planet, Star
+from app.search import search_transits
+from app.sky_index import get_sky_index
+from app.export import results_frame, iter_export, EXPORT_FORMATS
+from app.jobs import get_runner, refresh_catalog, refresh_job
+from app import metrics
+
+DATA_SOURCE = os.getenv("API_DATA_SOURCE", "PostgreSQL")
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+# Finished search frames kept for paging through them (entries, seconds)
+RESULT_CACHE_SIZE = int(os.getenv("API_RESULT_CACHE", "16"))
+RESULT_TTL = float(os.getenv("API_RESULT_TTL", "300"))
+MAX_WINDOW_HOURS = 336
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+# ?format= value -> app.export format label
+EXPORT_LABELS = {"csv": "CSV", "xlsx": "XLSX", "parquet": "Parquet"}
+
+_pool = None
+_inflight = {}
+_results = OrderedDict() # key -> (finished, frame), least recently used first
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Fresh interpreters instead of forks of the event loop process (and its threads)
+        _pool = ProcessPoolExecutor(max_workers=API_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+@asynccontextmanager
+async def lifespan(app):
+    global _pool
+    yield
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+app = FastAPI(title="ExoHunter Pro API", version="1.0", lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+def _search_frame(params):
+    """Worker-process entry point: full search, returned as a columnar DataFrame."""
+    transits = search_transits(get_session_factory(params.pop("data_source")), **params)
+    return results_frame(transits)
+
+def _cached_result(key):
+    entry = _results.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] > RESULT_TTL:
+        del _results[key]
+        return None
+    _results.move_to_end(key)
+    return entry[1]
+
+def _store_result(key, future):
+    _inflight.pop(key, None)
+    if future.cancelled() or future.exception() is not None:
+        return
+    _results[key] = (time.monotonic(), future.result())
+    _results.move_to_end(key)
+    while len(_results) > RESULT_CACHE_SIZE:
+        _results.popitem(last=False)
+
+async def _coalesced(key, func, params):
+    """
+    Runs func(params) in the worker pool. Identical concurrent requests share one
+    computation, and the finished frame is cached (LRU, RESULT_TTL) so further pages
+    of the same query are sliced from it instead of searching again.
+    key must not include offset/limit.
+    """
+    metrics.CACHE_LOOKUPS.inc(cache="api_results")
+    frame = _cached_result(key)
+    if frame is not None:
+        return frame
+    future = _inflight.get(key)
+    if future is None:
+        metrics.CACHE_MISSES.inc(cache="api_results")
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(loop.run_in_executor(_get_pool(), func, dict(params)))
+        _inflight[key] = future
+        future.add_done_callback(lambda f: _store_result(key, f))
+    return await asyncio.shield(future)
+
+def _parse_sites(site, lat, lon, elevation):
+    """Repeated 'name,lat,lon[,elevation]' site params, or the single lat/lon/elevation site."""
+    if not site:
+        return [{"name": "Home", "lat": lat, "lon": lon, "elevation": elevation}]
+    sites = []
+    for spec in site:
+        parts = [p.strip() for p in spec.split(",")]
+        try:
+            sites.append({"name": parts[0], "lat": float(parts[1]), "lon": float(parts[2]),
+                          "elevation": float(parts[3]) if len(parts) > 3 else 0.0})
+        except (IndexError, ValueError):
+            raise HTTPException(status_code=422, detail=f"Invalid site '{spec}', expected name,lat,lon[,elevation]")
+    return sites
+
+def _wants_arrow(request, fmt):
+    return fmt == "arrow" or (fmt is None and ARROW_MIME in request.headers.get("accept", ""))
+
+def _page_response(request, frame, offset, limit, fmt):
+    """Paginated frame as Arrow IPC stream or JSON (gzip'd by the middleware when large)."""
+    total = len(frame)
+    page = frame.iloc[offset:offset + limit]
+    headers = {"X-Total-Count": str(total), "X-Offset": str(offset), "X-Limit": str(limit)}
+
+    if _wants_arrow(request, fmt):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(page, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MIME, headers=headers)
+
+    body = json.dumps({
+        "total": total, "offset": offset, "limit": limit,
+        "items": json.loads(page.to_json(orient="records", date_format="iso"))
+    })
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _search_params(start, hours, site, lat, lon, elevation, min_alt, max_mag, min_depth, priority, aperture, min_snr,
+                   min_moon_sep=0.0):
+    if hours <= 0 or hours > MAX_WINDOW_HOURS:
+        raise HTTPException(status_code=422, detail=f"hours must be in (0, {MAX_WINDOW_HOURS}]")
+    start = start or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return {
+        "data_source": DATA_SOURCE,
+        "start": start,
+        "end": start + timedelta(hours=hours),
+        "sites": _parse_sites(site, lat, lon, elevation),
+        "min_alt": min_alt,
+        "max_mag": max_mag,
+        "min_depth": min_depth,
+        "priorities": sorted(priority) if priority else None,
+        "aperture_in": aperture,
+        "min_snr": min_snr,
+        "min_moon_sep": min_moon_sep,
+    }
+
+@app.get("/search")
+async def search(
+    request: Request,
+    start: Optional[datetime] = Query(None, description="Window start (UTC), default: this hour"),
+    hours: float = Query(12.0, description="Window length (h)"),
+    site: Optional[List[str]] = Query(None, description="Repeatable: name,lat,lon[,elevation]"),
+    lat: float = 48.0880, lon: float = 15.7566, elevation: float = 640.0,
+    min_alt: float = 30.0, max_mag: float = 14.0, min_depth: float = 5.0,
+    priority: Optional[List[str]] = Query(None, description="Repeatable ExoClock priority"),
+    aperture: Optional[float] = Query(8.0, description="Telescope aperture (inches)"),
+    min_snr: float = 0.0,
+    min_moon_sep: float = Query(0.0, ge=0.0, le=180.0, description="Min moon separation (deg)"),
+    offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000),
+    format: Optional[str] = Query(None, pattern="^(json|arrow)$"),
+):
+    """Transit search over the catalog for one or more sites."""
+    params = _search_params(start, hours, site, lat, lon, elevation, min_alt, max_mag, min_depth,
+                            priority, aperture, min_snr, min_moon_sep)
+    key = json.dumps(params, sort_keys=True, default=str)
+    with metrics.API_REQUEST_SECONDS.time(endpoint="search"):
+        frame = await _coalesced(key, _search_frame, params)
+    # Engine metrics are recorded in the worker processes; the API sees the result size
+    metrics.SEARCH_EVENTS.observe(len(frame), source="api")
+    return _page_response(request, frame, offset, limit, format)
+
+@app.get("/search/export")
+async def search_export(
+    start: Optional[datetime] = Query(None, description="Window start (UTC), default: this hour"),
+    hours: float = Query(12.0, description="Window length (h)"),
+    site: Optional[List[str]] = Query(None, description="Repeatable: name,lat,lon[,elevation]"),
+    lat: float = 48.0880, lon: float = 15.7566, elevation: float = 640.0,
+    min_alt: float = 30.0, max_mag: float = 14.0, min_depth: float = 5.0,
+    priority: Optional[List[str]] = Query(None, description="Repeatable ExoClock priority"),
+    aperture: Optional[float] = Query(8.0, description="Telescope aperture (inches)"),
+    min_snr: float = 0.0,
+    min_moon_sep: float = Query(0.0, ge=0.0, le=180.0, description="Min moon separation (deg)"),
+    format: str = Query("csv", pattern="^(csv|xlsx|parquet)$"),
+):
+    """The whole /search result as a file download, streamed in row chunks (CSV, Parquet)."""
+    params = _search_params(start, hours, site, lat, lon, elevation, min_alt, max_mag, min_depth,
+                            priority, aperture, min_snr, min_moon_sep)
+    key = json.dumps(params, sort_keys=True, default=str)
+    with metrics.API_REQUEST_SECONDS.time(endpoint="search_export"):
+        frame = await _coalesced(key, _search_frame, params)
+    label = EXPORT_LABELS[format]
+    ext, mime = EXPORT_FORMATS[label]
+    headers = {"Content-Disposition": f'attachment; filename="transits.{ext}"', "X-Total-Count": str(len(frame))}
+    return StreamingResponse(iter_export(frame, label), media_type=mime, headers=headers)
+
+@app.get("/planets/{name}/transits")
+async def planet_transits(
+    request: Request,
+    name: str,
+    start: Optional[datetime] = None,
+    hours: float = 168.0,
+    site: Optional[List[str]] = Query(None),
+    lat: float = 48.0880, lon: float = 15.7566, elevation: float = 640.0,
+    min_alt: float = 0.0,
+    offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000),
+    format: Optional[str] = Query(None, pattern="^(json|arrow)$"),
+):
+    """All transits of one planet in the window (no magnitude/depth/priority filters)."""
+    params = _search_params(start, hours, site, lat, lon, elevation, min_alt, None, None, None, None, 0.0)
+    params["planet_name"] = name
+    key = json.dumps(params, sort_keys=True, default=str)
+    with metrics.API_REQUEST_SECONDS.time(endpoint="planet_transits"):
+        frame = await _coalesced(key, _search_frame, params)
+    return _page_response(request, frame, offset, limit, format)
+
+def _catalog_frame(data_source, name, priority, cone=None):
+    session_factory = get_session_factory(data_source)
+    star_ids = get_sky_index(session_factory).cone(*cone).tolist() if cone else None
+    db = session_factory()
+    try:
+        query = db.query(Planet, Star).join(Star)
+        if star_ids is not None:
+            query = query.filter(Star.id.in_(star_ids))
+        if name:
+            query = query.filter(Planet.name.ilike(f"%{name}%"))
+        if priority:
+            query = query.filter(Planet.priority.in_(priority))
+        rows = [{
+            "name": p.name, "star": s.name, "ra": s.ra, "dec": s.dec, "mag_v": s.mag_v,
+            "period": p.period, "t0_bjd_tdb": p.t0, "duration_h": p.duration, "depth_mmag": p.depth_mmag,
+            "period_err": p.period_err, "t0_err": p.t0_err, "min_telescope_in": p.min_telescope_in,
+            "priority": p.priority
+        } for p, s in query.order_by(Planet.name).all()]
+    finally:
+        db.close()
+    return pd.DataFrame(rows)
+
+@app.get("/catalog")
+async def catalog(
+    request: Request,
+    name: Optional[str] = Query(None, description="Substring match on the planet name"),
+    priority: Optional[List[str]] = Query(None),
+    ra: Optional[float] = Query(None, description="Cone search center RA (deg)"),
+    dec: Optional[float] = Query(None, description="Cone search center Dec (deg)"),
+    radius: float = Query(1.0, gt=0.0, le=180.0, description="Cone search radius (deg)"),
+    offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000),
+    format: Optional[str] = Query(None, pattern="^(json|arrow)$"),
+):
+    """Catalog lookup (planet + host star parameters), optionally within a cone."""
+    cone = (ra, dec, radius) if ra is not None and dec is not None else None
+    with metrics.API_REQUEST_SECONDS.time(endpoint="catalog"):
+        frame = await asyncio.to_thread(_catalog_frame, DATA_SOURCE, name, priority, cone)
+    return _page_response(request, frame, offset, limit, format)
+
+def _job_json(job):
+    if job is None:
+        return {"status": "idle"}
+    return {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in job.items()}
+
+@app.get("/refresh")
+def refresh_status():
+    """Status of the latest catalog refresh and the next weekly run."""
+    runner = get_runner()
+    next_run = runner.next_scheduled(refresh_job(DATA_SOURCE))
+    return {"job": _job_json(runner.latest(refresh_job(DATA_SOURCE))), "next_scheduled": next_run.isoformat() if next_run else None}
+
+@app.post("/refresh", status_code=202)
+def refresh_start():
+    """Queues a catalog refresh (no-op if one is already queued or running)."""
+    runner = get_runner()
+    job_id = runner.submit(refresh_job(DATA_SOURCE), refresh_catalog, data_source=DATA_SOURCE)
+    return _job_json(runner.status(job_id))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text format metrics of the API process."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
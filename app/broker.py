@@ -1,7 +1,11 @@
+import os
+import time
 import requests
 from astroquery.ipac.nexsci.nasa_exoplanet_archive import NasaExoplanetArchive
-from app.database import SessionLocal
-from app.models import Star, Planet
+from app.database import SessionLocal, Base
+from app.models import Star, Planet, StarAlias, PlanetAlias
+from app.crossmatch import CatalogMatcher, normalize_name, DEFAULT_TOLERANCE_ARCSEC
+from app import metrics
 import numpy as np
 import logging
 from astropy.coordinates import SkyCoord
@@ -20,34 +24,59 @@ def fetch_exoclock_data():
         data = response.json()
         return data if isinstance(data, dict) else {}
     except Exception as e:
+        metrics.FETCH_FAILURES.inc(source="exoclock")
         logger.error(f"Failed to fetch ExoClock data: {e}")
         return {}
 
-def normalize_name(name):
-    """Normalizes planet name for comparison (lowercase, no spaces/dashes)."""
-    if not name: return ""
-    return str(name).lower().replace(" ", "").replace("-", "")
-
-def update_database(session_factory=None):
+def update_database(session_factory=None, progress=None, match_tolerance_arcsec=None):
     """Fetches data from ExoClock (primary) and NASA (fallback) to update local DB.
     
     Args:
         session_factory: Optional sessionmaker. Defaults to Postgres SessionLocal.
+        progress: Optional callback(fraction, message) for background job reporting.
+        match_tolerance_arcsec: Positional cross-match radius for host stars.
+            Defaults to CROSSMATCH_ARCSEC from the environment (5").
+
+    Returns:
+        dict with the number of planets upserted per source and the list of
+        cross-match decisions ("merges").
+
+    Raises:
+        Any error of the update, after rolling back the uncommitted part, so
+        that background jobs are marked failed.
     """
+    def report(fraction, message):
+        if progress:
+            progress(fraction, message)
+
+    started = time.perf_counter()
     if session_factory:
         db = session_factory()
     else:
         db = SessionLocal()
 
+    if match_tolerance_arcsec is None:
+        match_tolerance_arcsec = float(os.getenv("CROSSMATCH_ARCSEC", DEFAULT_TOLERANCE_ARCSEC))
+
     processed_planets = set()
+    exoclock_planet_ids = set()
+    summary = {"exoclock": 0, "nasa": 0, "merges": []}
 
     try:
+        # Alias tables may be missing in databases created before they existed
+        Base.metadata.create_all(bind=db.get_bind(), tables=[StarAlias.__table__, PlanetAlias.__table__])
+        # Whole catalog + aliases in memory, positions in a k-d tree
+        matcher = CatalogMatcher(db, match_tolerance_arcsec)
+
         # 1. Fetch ExoClock Data (Primary Source)
         logger.info("Fetching data from ExoClock...")
+        report(0.0, "Fetching ExoClock data...")
         exoclock_data = fetch_exoclock_data()
         logger.info(f"Fetched {len(exoclock_data)} planets from ExoClock.")
         
-        for key, val in exoclock_data.items():
+        for i, (key, val) in enumerate(exoclock_data.items()):
+            if i % 100 == 0:
+                report(0.05 + 0.35 * i / len(exoclock_data), f"ExoClock: {i}/{len(exoclock_data)} planets")
             try:
                 # Key is usually normalized (e.g. 55Cnce), val['name'] might be nicer
                 raw_name = val.get('name', key)
@@ -84,11 +113,12 @@ def update_database(session_factory=None):
                 # Try to find star by name (normalized?) or just raw name match?
                 # Stars are harder to normalize perfectly without a catalog. 
                 # We'll stick to the provided star name.
-                star = db.query(Star).filter(Star.name == host_name).first()
+                star = matcher.resolve_star(host_name, ra, dec, "ExoClock")
                 if not star:
                     star = Star(name=host_name, ra=ra, dec=dec, mag_v=vmag)
                     db.add(star)
                     db.flush()
+                    matcher.add_star(star)
                 else:
                     star.ra = ra
                     star.dec = dec
@@ -127,7 +157,7 @@ def update_database(session_factory=None):
                 
                 prio = val.get('priority', 'Normal').title()
                 
-                planet = db.query(Planet).filter(Planet.name == raw_name).first()
+                planet = matcher.resolve_planet(raw_name, star, period, "ExoClock")
                 if not planet:
                     planet = Planet(
                         name=raw_name,
@@ -142,6 +172,8 @@ def update_database(session_factory=None):
                         priority=prio
                     )
                     db.add(planet)
+                    db.flush()
+                    matcher.add_planet(planet)
                 else:
                     planet.period = period
                     planet.t0 = t0
@@ -153,23 +185,34 @@ def update_database(session_factory=None):
                     planet.priority = prio
                 
                 processed_planets.add(norm_name)
+                exoclock_planet_ids.add(planet.id)
+                summary["exoclock"] += 1
                 
             except Exception as item_err:
                 logger.error(f"Error processing ExoClock item {key}: {item_err}")
                 continue
 
         db.commit() # Commit ExoClock batch
+        metrics.ROWS_UPSERTED.inc(summary["exoclock"], source="exoclock")
+        matcher.rebuild_index() # Make ExoClock hosts matchable by position
         
         # 2. Fetch NASA Data (Fallback)
         logger.info("Fetching data from NASA Exoplanet Archive...")
-        nasa_table = NasaExoplanetArchive.query_criteria(
-            table="pscomppars",
-            select="pl_name,hostname,ra,dec,sy_vmag,pl_orbper,pl_tranmid,pl_trandur,pl_trandep",
-            where="pl_tranmid is not null and pl_trandur is not null"
-        )
+        report(0.4, "Fetching NASA Exoplanet Archive data...")
+        try:
+            nasa_table = NasaExoplanetArchive.query_criteria(
+                table="pscomppars",
+                select="pl_name,hostname,ra,dec,sy_vmag,pl_orbper,pl_tranmid,pl_trandur,pl_trandep",
+                where="pl_tranmid is not null and pl_trandur is not null"
+            )
+        except Exception:
+            metrics.FETCH_FAILURES.inc(source="nasa")
+            raise
         logger.info(f"Fetched {len(nasa_table)} planets from NASA.")
         
-        for row in nasa_table:
+        for i, row in enumerate(nasa_table):
+            if i % 250 == 0:
+                report(0.5 + 0.5 * i / len(nasa_table), f"NASA: {i}/{len(nasa_table)} planets")
             pl_name = str(row['pl_name'])
             norm_name = normalize_name(pl_name)
             
@@ -191,7 +234,13 @@ def update_database(session_factory=None):
             dec = get_val(row['dec'])
             vmag = get_val(row['sy_vmag'])
             
-            star = db.query(Star).filter(Star.name == host_name).first()
+            period = get_val(row['pl_orbper'], 0.0)
+
+            star = matcher.resolve_star(host_name, ra, dec, "NASA")
+            planet = matcher.resolve_planet(pl_name, star, period, "NASA")
+            if planet is not None and planet.id in exoclock_planet_ids:
+                continue # Same planet under another name, ExoClock data wins
+
             if not star:
                 star = Star(
                     name=host_name,
@@ -201,6 +250,7 @@ def update_database(session_factory=None):
                 )
                 db.add(star)
                 db.flush()
+                matcher.add_star(star)
             else:
                 # Only update if we are the primary source for this star (optional)
                 # But a star might host multiple planets, some in ExoClock, some not.
@@ -209,9 +259,6 @@ def update_database(session_factory=None):
                 if dec is not None: star.dec = dec
                 if vmag is not None: star.mag_v = vmag
 
-            planet = db.query(Planet).filter(Planet.name == pl_name).first()
-            
-            period = get_val(row['pl_orbper'], 0.0)
             t0 = get_val(row['pl_tranmid'], 0.0)
             duration = get_val(row['pl_trandur'], 0.0)
             depth_raw = get_val(row['pl_trandep'], 0.0) # Usually percent
@@ -239,6 +286,8 @@ def update_database(session_factory=None):
                     priority=priority
                 )
                 db.add(planet)
+                db.flush()
+                matcher.add_planet(planet)
             else:
                 planet.period = period
                 planet.t0 = t0
@@ -246,12 +295,20 @@ def update_database(session_factory=None):
                 planet.depth_mmag = depth_mmag
                 # Don't overwrite priority if it was set manually, but here we treat NASA as fresh insert for non-ExoClock
                 planet.priority = priority
+            summary["nasa"] += 1
         
         db.commit()
-        logger.info("Database update complete.")
+        summary["merges"] = matcher.decisions
+        metrics.ROWS_UPSERTED.inc(summary["nasa"], source="nasa")
+        metrics.REFRESH_LAST_SUCCESS.set(time.time())
+        logger.info(f"Database update complete ({len(matcher.decisions)} cross-match decisions).")
         
     except Exception as e:
         logger.error(f"Error updating database: {e}")
         db.rollback()
+        raise
     finally:
         db.close()
+        metrics.REFRESH_SECONDS.observe(time.perf_counter() - started)
+
+    return summary
@@ -0,0 +1,152 @@
+import logging
+import numpy as np
+from scipy.spatial import cKDTree
+from app.models import Star, Planet, StarAlias, PlanetAlias
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE_ARCSEC = 5.0
+PERIOD_TOLERANCE = 1e-3 # Relative period difference for "same planet around the same star"
+
+def normalize_name(name):
+    """Normalizes planet name for comparison (lowercase, no spaces/dashes)."""
+    if not name: return ""
+    return str(name).lower().replace(" ", "").replace("-", "")
+
+def unit_vectors(ra, dec):
+    ra = np.radians(np.asarray(ra, dtype=float))
+    dec = np.radians(np.asarray(dec, dtype=float))
+    return np.column_stack((np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)))
+
+def chord(radius_deg):
+    """Great-circle radius (deg) -> straight-line distance between unit vectors."""
+    return 2.0 * np.sin(np.radians(np.clip(radius_deg, 0.0, 180.0)) / 2.0)
+
+def _has_position(ra, dec):
+    # The broker stores 0/0 when a source had no parsable coordinates
+    return ra is not None and dec is not None and not (ra == 0.0 and dec == 0.0)
+
+class CatalogMatcher:
+    """
+    Resolves incoming star/planet records against the catalog in memory:
+    exact name, then normalized name or alias, then sky position (stars) or
+    host + period (planets). New cross-identifications are stored as aliases
+    and every merge decision is kept in `decisions`.
+    """
+
+    def __init__(self, db, tolerance_arcsec=DEFAULT_TOLERANCE_ARCSEC):
+        self.db = db
+        self.tolerance_arcsec = tolerance_arcsec
+        self.decisions = []
+        self._reported = set()
+
+        self.stars_by_name = {s.name: s for s in db.query(Star).all()}
+        self.stars_by_id = {s.id: s for s in self.stars_by_name.values()}
+        self.star_keys = {normalize_name(name): s for name, s in self.stars_by_name.items()}
+        for alias in db.query(StarAlias).all():
+            if alias.star_id in self.stars_by_id:
+                self.star_keys.setdefault(normalize_name(alias.alias), self.stars_by_id[alias.star_id])
+
+        self.planets_by_name = {p.name: p for p in db.query(Planet).all()}
+        planets_by_id = {p.id: p for p in self.planets_by_name.values()}
+        self.planet_keys = {normalize_name(name): p for name, p in self.planets_by_name.items()}
+        for alias in db.query(PlanetAlias).all():
+            if alias.planet_id in planets_by_id:
+                self.planet_keys.setdefault(normalize_name(alias.alias), planets_by_id[alias.planet_id])
+        self.planets_by_star = {}
+        for p in self.planets_by_name.values():
+            self.planets_by_star.setdefault(p.star_id, []).append(p)
+
+        self._star_aliases = {a for (a,) in db.query(StarAlias.alias).all()}
+        self._planet_aliases = {a for (a,) in db.query(PlanetAlias.alias).all()}
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Re-indexes star positions (call after a source pass added stars)."""
+        stars = [s for s in self.stars_by_name.values() if _has_position(s.ra, s.dec)]
+        self._indexed = stars
+        self._tree = cKDTree(unit_vectors([s.ra for s in stars], [s.dec for s in stars])) if stars else None
+
+    def _record(self, source, kind, incoming, matched, method, separation_arcsec=None):
+        # A host is resolved once per planet row; report each cross-identification once per run
+        if (source, kind, incoming) in self._reported:
+            return
+        self._reported.add((source, kind, incoming))
+        decision = {"source": source, "kind": kind, "incoming": incoming, "matched": matched,
+                    "method": method, "separation_arcsec": separation_arcsec}
+        self.decisions.append(decision)
+        sep = f" ({separation_arcsec:.2f}\")" if separation_arcsec is not None else ""
+        logger.info(f"Cross-match [{source}] {kind} '{incoming}' -> '{matched}' by {method}{sep}")
+
+    def _nearest_star(self, ra, dec):
+        if self._tree is None or not _has_position(ra, dec):
+            return None, None
+        dist, idx = self._tree.query(unit_vectors([ra], [dec])[0],
+                                     distance_upper_bound=chord(self.tolerance_arcsec / 3600.0))
+        if not np.isfinite(dist):
+            return None, None
+        return self._indexed[idx], float(np.degrees(2.0 * np.arcsin(min(dist / 2.0, 1.0))) * 3600.0)
+
+    def resolve_star(self, name, ra, dec, source):
+        """Existing Star for an incoming host record, or None if it is new."""
+        star = self.stars_by_name.get(name)
+        if star is not None:
+            return star
+
+        star = self.star_keys.get(normalize_name(name))
+        if star is not None:
+            self._record(source, "star", name, star.name, "name/alias")
+            self._add_star_alias(name, star, source)
+            return star
+
+        star, sep = self._nearest_star(ra, dec)
+        if star is not None:
+            self._record(source, "star", name, star.name, "position", sep)
+            self._add_star_alias(name, star, source, sep)
+        return star
+
+    def add_star(self, star):
+        """Registers a newly created (flushed) Star so later records can match it by name."""
+        self.stars_by_name[star.name] = star
+        self.stars_by_id[star.id] = star
+        self.star_keys.setdefault(normalize_name(star.name), star)
+
+    def resolve_planet(self, name, star, period, source):
+        """Existing Planet for an incoming record on a resolved host star, or None if it is new."""
+        planet = self.planets_by_name.get(name)
+        if planet is not None:
+            return planet
+
+        planet = self.planet_keys.get(normalize_name(name))
+        if planet is not None:
+            self._record(source, "planet", name, planet.name, "name/alias")
+            self._add_planet_alias(name, planet, source)
+            return planet
+
+        if star is not None and period:
+            for candidate in self.planets_by_star.get(star.id, []):
+                if candidate.period and abs(candidate.period - period) <= PERIOD_TOLERANCE * period:
+                    self._record(source, "planet", name, candidate.name, "host+period")
+                    self._add_planet_alias(name, candidate, source)
+                    return candidate
+        return None
+
+    def add_planet(self, planet):
+        """Registers a newly created (flushed) Planet."""
+        self.planets_by_name[planet.name] = planet
+        self.planet_keys.setdefault(normalize_name(planet.name), planet)
+        self.planets_by_star.setdefault(planet.star_id, []).append(planet)
+
+    def _add_star_alias(self, alias, star, source, separation_arcsec=None):
+        if alias in self._star_aliases:
+            return
+        self._star_aliases.add(alias)
+        self.db.add(StarAlias(alias=alias, star_id=star.id, source=source, separation_arcsec=separation_arcsec))
+        self.star_keys.setdefault(normalize_name(alias), star)
+
+    def _add_planet_alias(self, alias, planet, source):
+        if alias in self._planet_aliases:
+            return
+        self._planet_aliases.add(alias)
+        self.db.add(PlanetAlias(alias=alias, planet_id=planet.id, source=source))
+        self.planet_keys.setdefault(normalize_name(alias), planet)
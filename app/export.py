@@ -0,0 +1,180 @@
+import io
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from astropy.time import Time
+from app import fastsky
+from app.nina import to_sequence_json
+
+CHUNK_ROWS = 5000
+
+# Label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "N.I.N.A JSON": ("json", "application/json"),
+}
+
+# Plain numeric/text columns copied from the transit records as-is
+VALUE_COLUMNS = [
+    "altitude", "sun_alt", "moon_sep", "moon_ill", "meridian_flip", "depth", "duration",
+    "mag_v", "min_telescope_in", "priority", "uncertainty_min", "snr", "score", "ra", "dec",
+    "telescope"
+]
+
+def _utc_jd(jd_tdb):
+    t = Time(np.asarray(jd_tdb, dtype=float), format="jd", scale="tdb").utc
+    return t.jd1 + t.jd2
+
+def _tdb_jd(times):
+    """TDB Julian dates of a list of Time scalars (slow, for records without mid_jd)."""
+    return Time(list(times)).tdb.jd
+
+def _time_columns(frame, prefix, jd_tdb, jd_utc, local_tz):
+    """Adds <prefix>_bjd_tdb, <prefix>_utc and <prefix>_local columns from TDB and UTC Julian date arrays."""
+    frame[f"{prefix}_bjd_tdb"] = jd_tdb
+    utc = pd.to_datetime((jd_utc - fastsky.UNIX_EPOCH_JD) * 86400.0, unit="s").round("ms").tz_localize("UTC")
+    frame[f"{prefix}_utc"] = utc.tz_localize(None)
+    # Excel cannot store tz-aware values, so local wall-clock time is kept naive
+    frame[f"{prefix}_local"] = utc.tz_convert(local_tz).tz_localize(None)
+
+def results_frame(transits, tz=None):
+    """
+    Machine-readable, columnar view of transit records (one row per event):
+    raw BJD_TDB / UTC / local datetimes instead of formatted strings.
+    tz: timezone for the *_local columns, defaults to the server's local zone.
+    """
+    local_tz = tz or datetime.now().astimezone().tzinfo
+    frame = pd.DataFrame({"planet_name": [t["planet_name"] for t in transits]})
+    if not transits:
+        return frame
+
+    first = transits[0]
+    for key in ("site", "epoch", "night"):
+        if key in first:
+            frame[key] = [t.get(key) for t in transits]
+    if "night" in frame:
+        # Night id is the JD of the local noon that starts the night
+        frame["night"] = pd.to_datetime(Time(frame["night"].to_numpy(dtype=float), format="jd").datetime64).date
+
+    if all("mid_jd" in t for t in transits):
+        # Ingress/egress are mid -/+ half the duration (see app.logic), so all three columns
+        # come from one JD array and one TDB -> UTC conversion instead of thousands of Time scalars
+        mid_jd = np.array([t["mid_jd"] for t in transits], dtype=float)
+        mid_utc = _utc_jd(mid_jd)
+        half = np.nan_to_num(np.array([t.get("duration") or 0.0 for t in transits], dtype=float)) / 48.0
+        _time_columns(frame, "mid", mid_jd, mid_utc, local_tz)
+        _time_columns(frame, "ingress", mid_jd - half, mid_utc - half, local_tz)
+        _time_columns(frame, "egress", mid_jd + half, mid_utc + half, local_tz)
+    else:
+        for prefix, key in (("mid", "mid_time"), ("ingress", "ingress"), ("egress", "egress")):
+            jd = _tdb_jd(t[key] for t in transits)
+            _time_columns(frame, prefix, jd, _utc_jd(jd), local_tz)
+    if "block_start" in first:
+        for key in ("block_start", "block_end"):
+            jd = _tdb_jd(t[key] for t in transits)
+            _time_columns(frame, key, jd, _utc_jd(jd), local_tz)
+
+    for col in VALUE_COLUMNS:
+        if col in first:
+            frame[col] = [t.get(col) for t in transits]
+    return frame.rename(columns={"depth": "depth_mmag", "duration": "duration_h"})
+
+def _chunks(frame, chunksize):
+    for start in range(0, len(frame), chunksize):
+        yield frame.iloc[start:start + chunksize]
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are taken (and released) by the export generators."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def iter_csv(frame, chunksize=CHUNK_ROWS):
+    """Yields UTF-8 CSV one row chunk at a time (header in the first)."""
+    if frame.empty:
+        yield frame.to_csv(index=False).encode("utf-8")
+        return
+    header = True
+    for chunk in _chunks(frame, chunksize):
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+def iter_parquet(frame, chunksize=CHUNK_ROWS):
+    """Yields Parquet bytes as each row group (one per chunk) is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _chunks(frame, chunksize):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.take()
+    yield sink.take() # Footer
+
+def iter_xlsx(frame, chunksize=CHUNK_ROWS):
+    """
+    Yields a single-sheet XLSX (openpyxl write-only workbook). The zip container is
+    only written on save, so this is one piece; rows are still converted chunk-wise.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("XLSX export requires 'openpyxl' (pip install openpyxl)") from e
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Schedule")
+    ws.append(list(frame.columns))
+    for chunk in _chunks(frame, chunksize):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row])
+    sink = _Drain()
+    wb.save(sink)
+    yield sink.take()
+
+# Label -> generator over a results_frame
+FRAME_WRITERS = {"CSV": iter_csv, "XLSX": iter_xlsx, "Parquet": iter_parquet}
+
+def iter_export(frame, fmt, chunksize=CHUNK_ROWS):
+    """Streams a results_frame in one of FRAME_WRITERS as byte chunks (e.g. for an HTTP response)."""
+    writer = FRAME_WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return writer(frame, chunksize)
+
+def export_bytes(transits, fmt, tz=None):
+    """
+    Renders transit records in one of EXPORT_FORMATS as a whole file. Meant to be
+    called lazily (e.g. as a download_button data callable) so nothing is built
+    until requested. Large exports that should not be held in memory go through
+    iter_export instead (see the API's /search/export).
+    transits: list of transit dicts or a DataFrame of them.
+    """
+    if isinstance(transits, pd.DataFrame):
+        transits = transits.to_dict('records')
+    if fmt == "N.I.N.A JSON":
+        return to_sequence_json(transits).encode("utf-8")
+    if fmt not in FRAME_WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return b"".join(iter_export(results_frame(transits, tz=tz), fmt))
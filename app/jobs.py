@@ -0,0 +1,182 @@
+import os
+import queue
+import threading
+import itertools
+import logging
+from datetime import datetime, timedelta
+from app.database import get_session_factory
+from app.broker import update_database
+
+logger = logging.getLogger(__name__)
+
+REFRESH_JOB = "catalog_refresh"
+WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+
+# Callables run after every successful catalog refresh: hook(session_factory, progress)
+_refresh_hooks = []
+
+def register_refresh_hook(func):
+    """Registers dependent precompute work to run in the worker after each catalog refresh."""
+    if func not in _refresh_hooks:
+        _refresh_hooks.append(func)
+    return func
+
+def refresh_job(data_source):
+    """Job kind of a catalog refresh. One per data source, so a running refresh of one
+    database does not swallow a refresh request for another."""
+    return f"{REFRESH_JOB}:{data_source}"
+
+def refresh_catalog(data_source="PostgreSQL", progress=None):
+    """
+    Broker refresh followed by all registered refresh hooks. Runs inside the job worker.
+    A failed refresh raises before the hooks, so the job is marked failed.
+    """
+    session_factory = get_session_factory(data_source)
+    summary = update_database(session_factory, progress=progress)
+    for hook in _refresh_hooks:
+        if progress:
+            progress(None, f"Running {hook.__name__}...")
+        hook(session_factory, progress)
+    return summary
+
+def next_weekly_run(now, weekday, hour, minute):
+    """Next datetime after `now` falling on weekday (0=Monday) at hour:minute."""
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    candidate += timedelta(days=(weekday - now.weekday()) % 7)
+    if candidate <= now:
+        candidate += timedelta(days=7)
+    return candidate
+
+class JobRunner:
+    """
+    In-process background jobs: one worker thread draining a FIFO queue and a
+    job table that the UI polls. A job kind that is already queued or running
+    is not queued twice; the existing job id is returned instead. Arguments are
+    not compared, so the kind must name everything that makes jobs distinct
+    (see refresh_job).
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._schedules = []
+        self._worker = threading.Thread(target=self._work, name="exohunter-jobs", daemon=True)
+        self._worker.start()
+
+    def submit(self, kind, func, *args, **kwargs):
+        """
+        Queues func(*args, progress=..., **kwargs). func receives a progress(fraction, message)
+        callback; fraction may be None for message-only updates.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job["kind"] == kind and job["status"] in ("queued", "running"):
+                    return job["id"]
+            job_id = next(self._ids)
+            self._jobs[job_id] = {
+                "id": job_id, "kind": kind, "status": "queued", "progress": 0.0, "message": "Queued",
+                "created": datetime.now(), "started": None, "finished": None, "error": None, "result": None
+            }
+        self._queue.put((job_id, func, args, kwargs))
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self, kind):
+        """Most recent job of a kind (any status), or None."""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j["kind"] == kind]
+            return dict(jobs[-1]) if jobs else None
+
+    def list_jobs(self):
+        with self._lock:
+            return [dict(j) for j in self._jobs.values()]
+
+    def schedule_weekly(self, kind, func, weekday=6, hour=3, minute=0, **kwargs):
+        """Cron-like trigger: submits func every week on weekday (0=Monday) at hour:minute local time."""
+        schedule = {"kind": kind, "next_run": next_weekly_run(datetime.now(), weekday, hour, minute)}
+        self._schedules.append(schedule)
+
+        def loop():
+            while not self._stop.is_set():
+                wait = (schedule["next_run"] - datetime.now()).total_seconds()
+                if wait > 0:
+                    # Wake up at least hourly so clock changes are picked up
+                    self._stop.wait(min(wait, 3600))
+                    continue
+                logger.info(f"Weekly trigger: submitting {kind}")
+                self.submit(kind, func, **kwargs)
+                schedule["next_run"] = next_weekly_run(datetime.now(), weekday, hour, minute)
+
+        threading.Thread(target=loop, name=f"exohunter-cron-{kind}", daemon=True).start()
+        return schedule
+
+    def next_scheduled(self, kind):
+        for schedule in self._schedules:
+            if schedule["kind"] == kind:
+                return schedule["next_run"]
+        return None
+
+    def shutdown(self):
+        self._stop.set()
+        self._queue.put(None)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _work(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                break
+            job_id, func, args, kwargs = item
+
+            def progress(fraction=None, message=None, job_id=job_id):
+                fields = {}
+                if fraction is not None:
+                    fields["progress"] = float(min(max(fraction, 0.0), 1.0))
+                if message:
+                    fields["message"] = message
+                self._update(job_id, **fields)
+
+            self._update(job_id, status="running", started=datetime.now(), message="Running")
+            try:
+                result = func(*args, progress=progress, **kwargs)
+                self._update(job_id, status="done", progress=1.0, result=result, message="Done", finished=datetime.now())
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                self._update(job_id, status="failed", error=str(e), message="Failed", finished=datetime.now())
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_runner():
+    """
+    Process-wide JobRunner (shared by all Streamlit sessions). The first call also
+    installs the weekly catalog refresh from WEEKLY_REFRESH (e.g. "SUN 03:00", "off"
+    to disable) against REFRESH_DATA_SOURCE (PostgreSQL or SQLite).
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+            spec = os.getenv("WEEKLY_REFRESH", "SUN 03:00").strip().upper()
+            if spec and spec != "OFF":
+                try:
+                    day, hhmm = spec.split()
+                    hour, minute = (int(x) for x in hhmm.split(":"))
+                    data_source = os.getenv("REFRESH_DATA_SOURCE", "PostgreSQL")
+                    _runner.schedule_weekly(
+                        refresh_job(data_source), refresh_catalog, weekday=WEEKDAYS.index(day[:3]), hour=hour,
+                        minute=minute, data_source=data_source
+                    )
+                except ValueError:
+                    logger.error(f"Invalid WEEKLY_REFRESH '{spec}', expected e.g. 'SUN 03:00'")
+        return _runner
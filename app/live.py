@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from astropy.time import Time
+from app import fastsky
+from app.scheduler import night_of
+from app.search import search_transits
+
+logger = logging.getLogger(__name__)
+
+def to_jd(dt):
+    """JD (UTC) of a datetime; naive datetimes are taken as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp() / 86400.0 + fastsky.UNIX_EPOCH_JD
+
+def jd_to_datetime64(jd):
+    return pd.to_datetime((np.asarray(jd, dtype=float) - fastsky.UNIX_EPOCH_JD) * 86400.0, unit="s").round("s")
+
+def night_window(now_jd, longitude):
+    """(night id, start JD, end JD) of the local noon-to-noon night containing now_jd."""
+    night = int(night_of(now_jd, longitude))
+    start = night - longitude / 360.0
+    return night, start, start + 1.0
+
+class TonightPlan:
+    """
+    Every transit of one night at one site, stored column-wise.
+    Built once per night; `tick` then only drops finished events, pulls in
+    events entering the look-ahead horizon and updates current altitudes with
+    the fastsky kernel. No database or astropy work per tick.
+    """
+
+    def __init__(self, night, site, transits):
+        self.night = night
+        self.site = site
+        self.built = datetime.now(timezone.utc)
+
+        def col(key, dtype=float):
+            return np.array([t[key] for t in transits], dtype=dtype)
+
+        self.planet_name = col("planet_name", object)
+        self.ra = col("ra")
+        self.dec = col("dec")
+        self.ingress = np.array([t["ingress"].utc.jd for t in transits], dtype=float)
+        self.mid = np.array([t["mid_time"].utc.jd for t in transits], dtype=float)
+        self.egress = np.array([t["egress"].utc.jd for t in transits], dtype=float)
+        self.mid_altitude = col("altitude")
+        self.depth = col("depth")
+        self.mag_v = np.array([t["mag_v"] if t["mag_v"] is not None else np.nan for t in transits], dtype=float)
+        self.priority = col("priority", object)
+        self.score = col("score")
+        self.uncertainty_min = col("uncertainty_min")
+        self.meridian_flip = col("meridian_flip", bool)
+
+    def __len__(self):
+        return len(self.planet_name)
+
+    def sun_altitude(self, now_jd):
+        return float(fastsky.sun_altitude(now_jd, self.site["lat"], self.site["lon"]))
+
+    def tick(self, now_jd, horizon_h=6.0):
+        """Events in progress or starting within horizon_h, with their current altitude."""
+        active = np.flatnonzero((self.egress >= now_jd) & (self.ingress <= now_jd + horizon_h / 24.0))
+        alt_now = fastsky.target_altitude(self.ra[active], self.dec[active], now_jd, self.site["lat"], self.site["lon"])
+        started = self.ingress[active] <= now_jd
+        duration = self.egress[active] - self.ingress[active]
+
+        return pd.DataFrame({
+            "planet_name": self.planet_name[active],
+            "status": np.where(started, "In progress", "Upcoming"),
+            "starts_in_min": np.round((self.ingress[active] - now_jd) * 1440.0),
+            "progress": np.clip((now_jd - self.ingress[active]) / duration, 0.0, 1.0),
+            "ingress": jd_to_datetime64(self.ingress[active]),
+            "mid_time": jd_to_datetime64(self.mid[active]),
+            "egress": jd_to_datetime64(self.egress[active]),
+            "alt_now": alt_now,
+            "altitude": self.mid_altitude[active],
+            "meridian_flip": self.meridian_flip[active],
+            "depth": self.depth[active],
+            "mag_v": self.mag_v[active],
+            "priority": self.priority[active],
+            "score": self.score[active],
+            "uncertainty_min": self.uncertainty_min[active],
+        })
+
+def build_tonight(session_factory, site, now_jd, **search_kwargs):
+    """
+    Runs the full search once for the night containing now_jd at one site
+    (dict with name, lat, lon, elevation). search_kwargs go to search_transits.
+    """
+    night, start_jd, end_jd = night_window(now_jd, site["lon"])
+    start = Time(start_jd, format="jd", scale="utc").to_datetime()
+    end = Time(end_jd, format="jd", scale="utc").to_datetime()
+    transits = search_transits(session_factory, start, end, [site], **search_kwargs)
+    logger.info(f"Tonight plan for {site['name']} (night {night}): {len(transits)} transits")
+    return TonightPlan(night, site, transits)
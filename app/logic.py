@@ -5,10 +5,12 @@ import numpy as np
 import pandas as pd
 from astroplan import Observer
 from app.models import Planet, Star
+from app.scoring import estimate_snr, observability_score
+from app import fastsky
 
-def get_observer(lat, lon, elevation=0):
+def get_observer(lat, lon, elevation=0, name=None):
     location = EarthLocation(lat=lat*u.deg, lon=lon*u.deg, height=elevation*u.m)
-    return Observer(location=location)
+    return Observer(location=location, name=name)
 
 def calculate_transits_in_window(planet_data, start_time, end_time, observer, min_alt=30, max_sun_alt=-6):
     """
@@ -38,8 +40,15 @@ def calculate_transits_in_window(planet_data, start_time, end_time, observer, mi
         
     transits = []
     target_coord = SkyCoord(ra=planet_data.ra*u.deg, dec=planet_data.dec*u.deg)
-    
-    for n in range(int(n_start), int(n_end) + 1):
+
+    # Cheap screen of all epochs; certain failures never reach astropy
+    n_all = np.arange(int(n_start), int(n_end) + 1)
+    jd_utc = t0 + n_all * period - (start_time.tdb.jd - start_time.utc.jd)
+    maybe = fastsky.screen(planet_data.ra, planet_data.dec, jd_utc, observer.location.lat.deg,
+                           observer.location.lon.deg, min_alt, max_sun_alt)
+
+    for n in n_all[maybe]:
+        n = int(n)
         mid_jd = t0 + n * period
         # t0 is BJD_TDB, so mid_jd is in TDB scale.
         # We specify scale='tdb' so astropy handles conversion to UTC (for display/calc) correctly.
@@ -107,6 +116,7 @@ def calculate_transits_in_window(planet_data, start_time, end_time, observer, mi
             transits.append({
                 "planet_name": planet_data.name,
                 "mid_time": mid_time,
+                "mid_jd": mid_jd,
                 "ingress": ingress_time,
                 "egress": egress_time,
                 "altitude": altitude,
@@ -126,6 +136,184 @@ def calculate_transits_in_window(planet_data, start_time, end_time, observer, mi
             
     return transits
 
+def enumerate_transit_epochs(planets, start_time, end_time):
+    """
+    Enumerates every transit of every planet inside the window in one pass.
+    Returns (planet index, epoch N, mid-transit JD_TDB) arrays.
+    """
+    period = np.array([p.period or 0.0 for p in planets], dtype=float)
+    t0 = np.array([p.t0 or 0.0 for p in planets], dtype=float)
+    valid = (period > 0) & (t0 > 0)
+    safe_period = np.where(valid, period, 1.0)
+
+    # Ephemerides are BJD_TDB, so compare against the window in TDB as well
+    n_start = np.ceil((start_time.tdb.jd - t0) / safe_period)
+    n_end = np.floor((end_time.tdb.jd - t0) / safe_period)
+    counts = np.where(valid, np.maximum(n_end - n_start + 1, 0), 0).astype(int)
+
+    idx = np.repeat(np.arange(len(planets)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    epochs = n_start[idx] + offsets
+    mid_jd = t0[idx] + epochs * period[idx]
+    return idx, epochs.astype(int), mid_jd
+
+def calculate_transits_multi_site(planets, start_time, end_time, observers, min_alt=30, max_sun_alt=-6,
+                                  aperture_in=None, min_snr=0.0, min_moon_sep=0.0):
+    """
+    Calculates transits for many planets at many sites at once.
+    Site-independent work (epoch enumeration, TDB->UTC, sun/moon positions,
+    timing errors) is done once; only the alt/az transform runs per site.
+    Epochs are screened first with app.fastsky, so the exact (reported)
+    astropy values are only computed for events that may pass the limits.
+    planets: objects with period, t0, duration, ra, dec (like calculate_transits_in_window)
+    observers: list of astroplan Observers, `observer.name` is used as the site label
+    aperture_in: telescope aperture (inches). If given, SNR, observability score and the
+                 lowest altitude over the transit (alt_low) are added and events below
+                 min_snr are dropped before any detail work.
+    min_moon_sep: events closer than this to the moon (deg) are dropped.
+    """
+    if not planets or not observers:
+        return []
+
+    idx, epochs, mid_jd = enumerate_transit_epochs(planets, start_time, end_time)
+    if len(idx) == 0:
+        return []
+
+    # Screening tier: drop epochs that certainly fail the altitude/sun limits at
+    # every site with the NumPy kernel; astropy only sees the survivors.
+    ra = np.array([p.ra or 0.0 for p in planets], dtype=float)[idx]
+    dec = np.array([p.dec or 0.0 for p in planets], dtype=float)[idx]
+    mid_jd_utc = mid_jd - (start_time.tdb.jd - start_time.utc.jd)
+    keep = np.zeros(len(idx), dtype=bool)
+    for observer in observers:
+        keep |= fastsky.screen(ra, dec, mid_jd_utc, observer.location.lat.deg, observer.location.lon.deg,
+                               min_alt, max_sun_alt)
+    if not keep.any():
+        return []
+    idx, epochs, mid_jd, ra, dec = idx[keep], epochs[keep], mid_jd[keep], ra[keep], dec[keep]
+
+    duration = np.array([p.duration or 0.0 for p in planets], dtype=float)[idx]
+    mag_v = np.array([p.mag_v if p.mag_v is not None else np.nan for p in planets], dtype=float)[idx]
+    depth = np.array([p.depth_mmag or 0.0 for p in planets], dtype=float)[idx]
+
+    # Shared: one TDB -> UTC conversion and one solar ephemeris for all epochs
+    mid_times = Time(mid_jd, format='jd', scale='tdb').utc
+    targets = SkyCoord(ra=ra*u.deg, dec=dec*u.deg)
+    sun = get_body("sun", mid_times)
+
+    # Per site: only the alt/az transforms
+    site_hits = []
+    for observer in observers:
+        altitude = observer.altaz(mid_times, targets).alt.deg
+        sun_alt = observer.altaz(mid_times, sun).alt.deg
+        mask = (altitude >= min_alt) & (sun_alt <= max_sun_alt)
+
+        snr = np.full(len(idx), np.nan)
+        if aperture_in is not None:
+            elevation = observer.location.height.to_value(u.m)
+            snr[mask] = estimate_snr(aperture_in, mag_v[mask], depth[mask], duration[mask], altitude[mask], elevation)
+            # Unknown magnitudes (NaN) are kept, clearly too faint/shallow events are not
+            mask &= ~(snr < min_snr)
+        site_hits.append((observer, mask, altitude, sun_alt, snr))
+
+    visible = np.zeros(len(idx), dtype=bool)
+    for _, mask, _, _, _ in site_hits:
+        visible |= mask
+    if not visible.any():
+        return []
+
+    # Shared detail work, only for epochs visible from at least one site.
+    # The moon is geocentric here; topocentric parallax is below 1 deg.
+    sel = np.flatnonzero(visible)
+    sel_times = mid_times[sel]
+    moon_sep = np.full(len(idx), np.nan)
+    moon_ill = np.zeros(len(idx))
+    moon = get_body("moon", sel_times)
+    moon_sep[sel] = moon.separation(targets[sel]).deg
+    try:
+        from astroplan import moon_illumination
+        moon_ill[sel] = moon_illumination(sel_times)
+    except ImportError:
+        pass # Fallback
+
+    if min_moon_sep > 0:
+        moon_ok = moon_sep >= min_moon_sep
+        site_hits = [(observer, mask & moon_ok, altitude, sun_alt, snr) for observer, mask, altitude, sun_alt, snr in site_hits]
+
+    half_dur = (duration / 24.0 / 2.0) * u.day
+    ingress = mid_times - half_dur
+    egress = mid_times + half_dur
+
+    # Error Propagation: sigma_T = sqrt(sigma_t0^2 + (N * sigma_P)^2)
+    t0_err = np.array([getattr(p, 't0_err', 0.0) or 0.0 for p in planets], dtype=float)[idx]
+    period_err = np.array([getattr(p, 'period_err', 0.0) or 0.0 for p in planets], dtype=float)[idx]
+    error_min = np.sqrt(t0_err**2 + (epochs * period_err)**2) * 24 * 60
+
+    transits = []
+    priority = np.array([p.priority for p in planets], dtype=object)[idx]
+
+    for observer, mask, altitude, sun_alt, snr in site_hits:
+        hits = np.flatnonzero(mask)
+        if len(hits) == 0:
+            continue
+
+        score = np.full(len(idx), np.nan)
+        alt_low = np.full(len(hits), np.nan)
+        if aperture_in is not None:
+            # Altitude profile: the lowest of ingress / mid / egress
+            alt_ingress = observer.altaz(ingress[hits], targets[hits]).alt.deg
+            alt_egress = observer.altaz(egress[hits], targets[hits]).alt.deg
+            alt_low = np.minimum(np.minimum(alt_ingress, alt_egress), altitude[hits])
+            score[hits] = observability_score(snr[hits], alt_low, moon_sep[hits], moon_ill[hits],
+                                              error_min[hits], duration[hits], priority[hits])
+
+        # Meridian flip: hour angle changes sign between ingress and egress
+        ha_ingress = (observer.local_sidereal_time(ingress[hits]) - targets[hits].ra).wrap_at(180*u.deg).deg
+        ha_egress = (observer.local_sidereal_time(egress[hits]) - targets[hits].ra).wrap_at(180*u.deg).deg
+        meridian_flip = np.sign(ha_ingress) != np.sign(ha_egress)
+
+        for k, i in enumerate(hits):
+            planet_data = planets[idx[i]]
+            transits.append({
+                "planet_name": planet_data.name,
+                "site": observer.name,
+                "epoch": int(epochs[i]),
+                "mid_time": mid_times[i],
+                "mid_jd": mid_jd[i], # BJD_TDB, for columnar exports
+                "ingress": ingress[i],
+                "egress": egress[i],
+                "altitude": altitude[i],
+                "alt_low": alt_low[k],
+                "sun_alt": sun_alt[i],
+                "meridian_flip": bool(meridian_flip[k]),
+                "moon_sep": moon_sep[i],
+                "moon_ill": moon_ill[i],
+                "depth": planet_data.depth_mmag,
+                "duration": planet_data.duration,
+                "ra": planet_data.ra,
+                "dec": planet_data.dec,
+                "mag_v": planet_data.mag_v,
+                "priority": planet_data.priority,
+                "uncertainty_min": error_min[i],
+                "min_telescope_in": getattr(planet_data, 'min_telescope_in', 0.0) or 0.0,
+                "snr": snr[i],
+                "score": score[i]
+            })
+
+    return transits
+
+def best_site_per_transit(df):
+    """
+    Reduces a multi-site result table to one row per transit (planet + epoch),
+    keeping the site with the best observability score (highest altitude at
+    mid-transit if no score was computed). Row order of the input is preserved.
+    """
+    if df.empty:
+        return df
+    key = "score" if "score" in df and df["score"].notna().any() else "altitude"
+    best_idx = df.groupby(["planet_name", "epoch"])[key].idxmax()
+    return df.loc[np.sort(best_idx.values)].reset_index(drop=True)
+
 def calculate_sky_gradient(time_array, observer):
     """
     Returns a list of colors/conditions for the given time array.
@@ -8,16 +8,27 @@ import streamlit as st
 import pandas as pd
 import app.warnings_config # Import this first to silence warnings
 from datetime import datetime, timedelta, time
-from app.ui_components import apply_theme, render_sidebar
+from functools import partial
+from app.ui_components import (apply_theme, render_sidebar, render_job_status, render_tonight, render_overview,
+                               render_season_strip)
 from app.database import SessionLocal, engine, Base, get_session_factory
 from app.models import Planet, Star
-from app.broker import update_database
-from app.logic import get_observer, calculate_transits_in_window, calculate_sky_gradient, calculate_moon_alt
+from app.jobs import get_runner, refresh_catalog, refresh_job
+from app.scheduler import plan_nights
+from app.search import query_candidates
+from app.sky_index import get_sky_index, prefilter_candidates
+from app.visibility import ensure_calendars, season_filter
+from app.nina import NinaClient, to_framing_csv
+from app.export import EXPORT_FORMATS, export_bytes
+from app.resultset import ResultSet, LOOSE_MIN_ALT, window_key
+from app import metrics
+from app.logic import get_observer, calculate_transits_multi_site, best_site_per_transit, calculate_sky_gradient, calculate_moon_alt
 import plotly.graph_objects as go
 import requests
 import json
 import numpy as np
 import astropy.units as u
+from astropy.time import Time
 
 # Init DB Tables if not exist
 # Note: For SQLite, this might need to run on the specific engine if we switch dynamically,
@@ -26,6 +37,7 @@ import astropy.units as u
 
 def run():
     st.set_page_config(page_title="ExoHunter Pro", layout="wide", page_icon="🔭")
+    metrics.start_metrics_server() # Once per process; METRICS_PORT=off disables it
 
     # Sidebar & Config
     config = render_sidebar()
@@ -45,13 +57,13 @@ def run():
     st.caption("Advanced Exoplanet Transit Planner")
 
     # Database Status / Update
+    # Refreshes run in the shared background worker, not in this session's script thread
+    runner = get_runner()
     if st.sidebar.button("Update Database (NASA/ExoClock)"):
         if data_source == "SQLite":
             st.sidebar.warning("Updating the static SQLite file will only persist for this session on cloud deployments.")
-        
-        with st.spinner("Fetching data from NASA Exoplanet Archive & ExoClock... This may take a minute."):
-            update_database(Session)
-        st.sidebar.success("Database updated successfully!")
+        runner.submit(refresh_job(data_source), refresh_catalog, data_source=data_source)
+    render_job_status(runner, refresh_job(data_source))
 
     # Search Filters
     with st.expander("Search Parameters", expanded=True):
@@ -62,59 +74,76 @@ def run():
         with col2:
             end_date_offset = st.number_input("Window Duration (Hours)", value=168, min_value=1, max_value=336)
             min_alt = st.number_input("Min Altitude (°)", value=30)
+            min_moon_sep = st.number_input("Min Moon Separation (°)", value=0, min_value=0, max_value=180)
         with col3:
             min_depth = st.number_input("Min Depth (mmag)", value=5.0)
             max_mag = st.number_input("Max Magnitude (V)", value=14.0)
         with col4:
             # Priority Filter
             priorities = st.multiselect("Priority (ExoClock)", ["High", "Medium", "Low", "Normal", "Alert"], default=["High", "Alert"])
+            min_snr = st.number_input("Min SNR", value=3.0, min_value=0.0, step=1.0, help="Expected transit SNR for your aperture")
+            sort_by = st.radio("Sort By", ["Time", "Score"], horizontal=True)
+
+    # Tonight (Live): the night is computed once, then only advanced on a timer
+    with st.expander("Tonight (Live)"):
+        live_col1, live_col2, live_col3 = st.columns(3)
+        with live_col1:
+            live_mode = st.toggle("Live Mode", help="Tonight's transits at the home site, updated as the night progresses")
+        with live_col2:
+            live_horizon = st.number_input("Look-ahead (Hours)", value=6, min_value=1, max_value=24)
+        with live_col3:
+            live_refresh = st.number_input("Refresh Every (s)", value=60, min_value=10, max_value=600)
+        if live_mode:
+            live_filters = {"min_alt": min_alt, "max_mag": max_mag, "min_depth": min_depth, "priorities": priorities,
+                            "aperture_in": config['aperture'], "min_snr": min_snr, "min_moon_sep": min_moon_sep}
+            render_tonight(data_source, config['sites'][0], live_filters, live_horizon, live_refresh)
 
     # Logic
+    # The search computes every transit of the window at loose thresholds; the filters
+    # above are then applied in memory on each rerun, so only the window and sites need a new search
+    start_dt = datetime.combine(search_date, start_hour)
+    end_dt = start_dt + timedelta(hours=end_date_offset)
+    search_key = window_key(data_source, start_dt, end_dt, config['sites'])
+    filters = {"min_alt": min_alt, "max_mag": max_mag, "min_depth": min_depth, "priorities": priorities,
+               "aperture_in": config['aperture'], "min_snr": min_snr, "min_moon_sep": min_moon_sep}
+
     if st.button("Find Transits"):
+        search_started = datetime.now()
         db = Session()
+        loose_min_alt = min(min_alt, LOOSE_MIN_ALT)
         
-        # 1. Static Filter (SQL)
+        # 1. Static Filter (SQL): everything; magnitude, depth and priority are applied afterwards
         try:
-            query = db.query(Planet, Star).join(Star).filter(
-                Star.mag_v <= max_mag,
-                Planet.depth_mmag >= min_depth
-            )
-            
-            if priorities:
-                query = query.filter(Planet.priority.in_(priorities))
-                
-            candidates = query.all()
+            planets = query_candidates(db)
             db.close()
             
-            st.write(f"Analyzing {len(candidates)} candidates matching static criteria...")
+            st.write(f"Analyzing {len(planets)} candidates...")
             
             # 2. Dynamic Calculation
-            start_dt = datetime.combine(search_date, start_hour)
-            end_dt = start_dt + timedelta(hours=end_date_offset)
-            
-            from astropy.time import Time
             t_start = Time(start_dt)
             t_end = Time(end_dt)
             
-            observer = get_observer(config['lat'], config['lon'], config['elevation'])
+            observers = [get_observer(site['lat'], site['lon'], site['elevation'], name=site['name']) for site in config['sites']]
+            star_ids = {p.name: p.star_id for p in planets}
             
-            progress_bar = st.progress(0)
+            # Seasonality from the precomputed visibility calendars (built in the background if missing)
+            ensure_calendars(runner, Session, config['sites'])
+            planets, out_of_season = season_filter(planets, Session, config['sites'], t_start.utc.jd, t_end.utc.jd, loose_min_alt)
+            if out_of_season:
+                st.caption(f"Visibility calendar: skipped {out_of_season} targets out of season.")
             
-            valid_transits = []
+            # Sky-position screening: drop hosts never up in the dark
+            planets, out_of_sky, _ = prefilter_candidates(
+                planets, get_sky_index(Session), observers, t_start, t_end, min_alt=loose_min_alt
+            )
+            if out_of_sky:
+                st.caption(f"Sky index: skipped {out_of_sky} targets out of the sky.")
+            metrics.SEARCH_CANDIDATES.observe(len(planets), source="ui")
             
-            for i, (planet, star) in enumerate(candidates):
-                if i % max(1, len(candidates)//10) == 0:
-                    progress_bar.progress(i / len(candidates))
-                    
-                planet_data = planet
-                planet_data.ra = star.ra
-                planet_data.dec = star.dec
-                planet_data.mag_v = star.mag_v
-                
-                transits = calculate_transits_in_window(planet_data, t_start, t_end, observer, min_alt=min_alt)
-                valid_transits.extend(transits)
-                
-            progress_bar.progress(100)
+            # One batched pass over all candidates and all sites
+            with st.spinner(f"Computing transits for {len(observers)} site(s)..."):
+                all_transits = calculate_transits_multi_site(planets, t_start, t_end, observers, min_alt=loose_min_alt,
+                                                             aperture_in=config['aperture'])
         
         except Exception as e:
             db.close()
@@ -130,24 +159,31 @@ def run():
                 st.rerun()
             st.stop() # Stop execution here
         
-        # Sort by mid_time ascending (soonest first)
-        
-        # Sort by mid_time ascending (soonest first)
-        valid_transits.sort(key=lambda x: x['mid_time'])
-        
-        # Filter by Aperture
-        initial_count = len(valid_transits)
-        valid_transits = [t for t in valid_transits if t.get('min_telescope_in', 0) <= config['aperture']]
-        hidden_count = initial_count - len(valid_transits)
+        # Columnar copy (sorted by mid_time) for the in-memory filters, built once per search
+        result_set = ResultSet(all_transits, config['sites'], search_key, loose_min_alt)
+        metrics.SEARCH_EVENTS.observe(len(result_set.select(**filters)[0]), source="ui")
+        metrics.SEARCH_SECONDS.observe((datetime.now() - search_started).total_seconds(), source="ui")
         
         # Store results in session state
-        st.session_state['transits_data'] = valid_transits
+        st.session_state['result_set'] = result_set
         st.session_state['search_performed'] = True
-        st.session_state['hidden_count'] = hidden_count
+        st.session_state['star_ids'] = star_ids
 
     if st.session_state.get('search_performed', False):
-        valid_transits = st.session_state.get('transits_data', [])
-        hidden_count = st.session_state.get('hidden_count', 0)
+        result_set = st.session_state['result_set']
+        # Filters are a mask over the stored result set (milliseconds, no database or astropy work)
+        valid_transits, hidden_count, results_overview = result_set.select(**filters)
+        st.session_state['transits_data'] = valid_transits
+        filter_key = (result_set.key, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in filters.items())))
+        if st.session_state.get('filter_key') != filter_key:
+            # A plan built from differently filtered results is stale
+            st.session_state['filter_key'] = filter_key
+            st.session_state['night_plan'] = None
+
+        if result_set.key != search_key:
+            st.info("Date, window or sites changed: click **Find Transits** to recompute. Showing the previous search with the current filters.")
+        elif min_alt < result_set.min_alt:
+            st.info(f"Min altitude is below the {result_set.min_alt:.0f}° this search covers: click **Find Transits** to include lower transits.")
 
         if not valid_transits:
             if hidden_count > 0:
@@ -159,11 +195,21 @@ def run():
                 st.caption(f"ℹ️ Hidden {hidden_count} candidates requiring aperture > {config['aperture']}\"")
                 
             st.success(f"Found {len(valid_transits)} observable transits.")
+            with st.expander("Overview: Timeline & Sky Map", expanded=True):
+                render_overview(results_overview)
             # Display Results
             df = pd.DataFrame(valid_transits)
+            if sort_by == "Score":
+                df = df.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+            
+            multi_site = df['site'].nunique() > 1
+            if multi_site:
+                site_view = st.radio("Site View", ["All Sites", "Best Site per Transit"], horizontal=True)
+                if site_view == "Best Site per Transit":
+                    df = best_site_per_transit(df)
             
-            # Re-create observer for detail view calculations (needed on rerun)
-            observer = get_observer(config['lat'], config['lon'], config['elevation'])
+            # Re-create observers for detail view calculations (needed on rerun)
+            observers = {site['name']: get_observer(site['lat'], site['lon'], site['elevation'], name=site['name']) for site in config['sites']}
             
             # Create display copy with proper formatting
             df_display = df.copy()
@@ -186,7 +232,9 @@ def run():
             # --- Layout Change: Table + Detail View ---
             
             # Define Columns to display
-            display_cols = ["planet_name", "mid_time", "uncertainty", "altitude", "depth", "duration", "mag_v", "priority", "moon_ill"]
+            display_cols = ["planet_name", "mid_time", "uncertainty", "altitude", "depth", "duration", "mag_v", "priority", "moon_ill", "snr", "score"]
+            if multi_site:
+                display_cols.insert(1, "site")
             
             col_list, col_detail = st.columns([1.5, 2.5]) # Left: Table, Right: Graph
             
@@ -202,7 +250,9 @@ def run():
                         "depth": "{:.2f}",
                         "duration": "{:.2f}",
                         "mag_v": "{:.1f}",
-                        "moon_ill": "{:.2f}"
+                        "moon_ill": "{:.2f}",
+                        "snr": "{:.0f}",
+                        "score": "{:.0f}"
                     }),
                     width="stretch", # Make it fit the column
                     hide_index=True,
@@ -211,16 +261,17 @@ def run():
                     key="transit_table"
                 )
                 
-                # CSV Download for ALL results
-                if not df_display.empty:
-                     csv_data = df_display.to_csv(index=False)
-                     st.download_button(
-                         label="Download Results CSV",
-                         data=csv_data,
-                         file_name=f"exohunter_results_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                         mime="text/csv",
-                         key="download_all_csv"
-                     )
+                # Export of ALL results, rendered only when the download is clicked
+                if not df.empty:
+                    export_fmt = st.selectbox("Export Format", list(EXPORT_FORMATS), key="results_export_fmt")
+                    ext, mime = EXPORT_FORMATS[export_fmt]
+                    st.download_button(
+                        label=f"Download Results {export_fmt}",
+                        data=partial(export_bytes, df, export_fmt),
+                        file_name=f"exohunter_results_{datetime.now().strftime('%Y%m%d_%H%M')}.{ext}",
+                        mime=mime,
+                        key="download_all_results"
+                    )
             
             selected_rows = event.selection.rows
             
@@ -228,9 +279,10 @@ def run():
                 if selected_rows:
                     idx = selected_rows[0]
                     row = df.iloc[idx] # Use original DF with Time objects
+                    observer = observers.get(row['site']) or next(iter(observers.values()))
                     
                     # Header matches Left Column
-                    st.markdown(f"### {row['planet_name']}")
+                    st.markdown(f"### {row['planet_name']}" + (f" · {row['site']}" if multi_site else ""))
                     
                     formatted_time = row['mid_time'].to_datetime().strftime('%d.%m.%Y %H:%M')
                     unc_min = row.get('uncertainty_min', 0)
@@ -324,17 +376,75 @@ def run():
                     
                     st.plotly_chart(fig, use_container_width=True)
                     
+                    site = next((s for s in config['sites'] if s['name'] == row['site']), config['sites'][0])
+                    render_season_strip(Session, site, st.session_state.get('star_ids', {}).get(row['planet_name']),
+                                        mark_date=row['mid_time'].to_datetime(),
+                                        template="plotly_dark" if config['theme'] != "Light" else "plotly_white")
+                    
                     # Actions
                     if st.button(f"Send {row['planet_name']} to N.I.N.A"):
-                         # ... NINA logic ...
-                         try:
-                            payload = {"Name": row['planet_name'], "Coordinates": {"RA": row['ra'], "Dec": row['dec']}}
-                            url = f"http://{nina_ip}:{nina_port}/api/v1/targets/add"
-                            st.info(f"Mock: Sent {row['planet_name']} to {url}")
-                         except Exception as e:
-                            st.error(f"Failed: {e}")
+                        with NinaClient(nina_ip, nina_port) as client:
+                            status = client.push_target(row)
+                        if status['ok']:
+                            st.success(f"Sent {row['planet_name']} to N.I.N.A ({status['elapsed']*1000:.0f} ms)")
+                        else:
+                            st.error(f"Failed: {status['error']}")
                 else:
                     st.info("Select a transit from the table on the left to see details.")
 
+            # --- Night Planner ---
+            with st.expander("Night Planner", expanded=False):
+                pcol1, pcol2, pcol3 = st.columns(3)
+                with pcol1:
+                    baseline_min = st.number_input("Baseline (min)", value=30, min_value=0, max_value=180, help="Out-of-transit baseline before ingress and after egress")
+                with pcol2:
+                    slew_min = st.number_input("Slew / Setup Margin (min)", value=5, min_value=0, max_value=60)
+                with pcol3:
+                    n_telescopes = st.number_input("Telescopes per Site", value=1, min_value=1, max_value=8)
+
+                if st.button("Plan Nights"):
+                    site_lons = {site['name']: site['lon'] for site in config['sites']}
+                    st.session_state['night_plan'] = plan_nights(
+                        df.to_dict('records'), baseline_min=baseline_min, slew_min=slew_min,
+                        telescopes=n_telescopes, longitude=site_lons
+                    )
+
+                night_plan = st.session_state.get('night_plan')
+                if night_plan:
+                    plan_df = pd.DataFrame(night_plan)
+                    # Night id is the JD of the local noon that starts the night
+                    plan_df['night'] = plan_df['night'].apply(lambda n: Time(n, format='jd').to_datetime().strftime('%d.%m.%Y'))
+                    plan_df['start'] = plan_df['block_start'].apply(lambda t: t.to_datetime().strftime('%H:%M'))
+                    plan_df['end'] = plan_df['block_end'].apply(lambda t: t.to_datetime().strftime('%H:%M'))
+                    plan_cols = ["night", "site", "telescope", "planet_name", "start", "end", "altitude", "priority", "score"]
+                    st.caption(f"{len(plan_df)} transits scheduled · total score {plan_df['score'].sum():.0f}")
+                    st.dataframe(
+                        plan_df[plan_cols].style.format({"altitude": "{:.1f}", "score": "{:.0f}"}),
+                        width="stretch", hide_index=True
+                    )
+
+                    ncol1, ncol2, ncol3 = st.columns(3)
+                    with ncol1:
+                        if st.button("Send Plan to N.I.N.A"):
+                            progress_bar = st.progress(0.0)
+                            with NinaClient(nina_ip, nina_port) as client:
+                                statuses = client.push_targets(
+                                    night_plan, progress=lambda done, total: progress_bar.progress(done / total)
+                                )
+                            sent = sum(1 for status in statuses if status['ok'])
+                            if sent == len(statuses):
+                                st.success(f"Sent {sent} targets to N.I.N.A")
+                            else:
+                                st.warning(f"Sent {sent} of {len(statuses)} targets to N.I.N.A")
+                                st.dataframe(pd.DataFrame(statuses), width="stretch", hide_index=True)
+                    with ncol2:
+                        plan_fmt = st.selectbox("Schedule Format", list(EXPORT_FORMATS), key="plan_export_fmt")
+                        ext, mime = EXPORT_FORMATS[plan_fmt]
+                        st.download_button(f"Download Schedule {plan_fmt}", data=partial(export_bytes, night_plan, plan_fmt),
+                                           file_name=f"exohunter_schedule.{ext}", mime=mime)
+                    with ncol3:
+                        st.download_button("Framing CSV", data=partial(to_framing_csv, night_plan),
+                                           file_name="exohunter_framing.csv", mime="text/csv")
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format 0.0.4, no client library needed
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_PORT = 9108
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+class Counter(_Metric):
+    """Monotonic counter. `inc()` is a dict update under a lock."""
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; each observation is one bisect and two additions."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+def render():
+    """All metrics in Prometheus text format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+# --- Planner ---
+SEARCH_SECONDS = Histogram("exohunter_search_seconds", "Transit search latency (SQL + prefilter + engine)", ["source"])
+SEARCH_CANDIDATES = Histogram("exohunter_search_candidates", "Candidates passed to the transit engine per search",
+                              ["source"], buckets=COUNT_BUCKETS)
+SEARCH_EVENTS = Histogram("exohunter_search_events", "Transit events returned per search", ["source"],
+                          buckets=COUNT_BUCKETS)
+PREFILTER_REJECTED = Counter("exohunter_prefilter_rejected_total", "Candidates dropped by the visibility calendar and the sky-index prefilter",
+                             ["reason"])
+CACHE_LOOKUPS = Counter("exohunter_cache_lookups_total", "Cache lookups", ["cache"])
+CACHE_MISSES = Counter("exohunter_cache_misses_total", "Cache lookups that had to compute", ["cache"])
+API_REQUEST_SECONDS = Histogram("exohunter_api_request_seconds", "HTTP API request latency", ["endpoint"])
+
+# --- Database ---
+DB_CONNECTIONS_IN_USE = Gauge("exohunter_db_connections_in_use", "Pooled DB connections checked out", ["dialect"])
+DB_CONNECTIONS_OPENED = Counter("exohunter_db_connections_opened_total", "New DB connections opened by the pools",
+                                ["dialect"])
+
+# --- Broker ---
+REFRESH_SECONDS = Histogram("exohunter_refresh_seconds", "Catalog refresh (broker) duration", [],
+                            buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+REFRESH_LAST_SUCCESS = Gauge("exohunter_refresh_last_success_timestamp_seconds", "Unix time of the last successful refresh")
+ROWS_UPSERTED = Counter("exohunter_rows_upserted_total", "Planets inserted or updated by the broker", ["source"])
+FETCH_FAILURES = Counter("exohunter_source_fetch_failures_total", "Failed catalog source downloads", ["source"])
+
+def _dialect(dbapi_connection):
+    return type(dbapi_connection).__module__.split(".")[0]
+
+# Pool events fire for every engine in the process, including the per-call SQLite engines
+@event.listens_for(Pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    DB_CONNECTIONS_OPENED.inc(dialect=_dialect(dbapi_connection))
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    dialect = connection_record.info["metrics_dialect"] = _dialect(dbapi_connection)
+    DB_CONNECTIONS_IN_USE.inc(dialect=dialect)
+
+@event.listens_for(Pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    # Invalidated connections are checked in without a DBAPI connection
+    dialect = connection_record.info.pop("metrics_dialect", None)
+    if dialect is not None:
+        DB_CONNECTIONS_IN_USE.dec(dialect=dialect)
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the log
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, addr=None):
+    """
+    Serves /metrics from a daemon thread (once per process).
+    Defaults: METRICS_PORT (9108, "off" disables) and METRICS_ADDR (127.0.0.1) from the environment.
+    Returns the server, or None if disabled or the port is taken.
+    """
+    global _server, _server_failed
+    port = port if port is not None else os.getenv("METRICS_PORT", str(DEFAULT_PORT))
+    if str(port).lower() == "off":
+        return None
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((addr or os.getenv("METRICS_ADDR", "127.0.0.1"), int(port)), _Handler)
+            except OSError as e:
+                # Don't retry on every Streamlit rerun
+                _server_failed = True
+                logger.warning(f"Metrics server not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on {_server.server_address[0]}:{_server.server_address[1]}/metrics")
+        return _server
@@ -58,3 +58,24 @@ class ObservationWindow(Base):
     is_visible = Column(Boolean, default=True)
     
     planet = relationship("Planet", back_populates="observations")
+
+class StarAlias(Base):
+    __tablename__ = "star_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alias = Column(String, unique=True, index=True) # Name as given by the source
+    star_id = Column(Integer, ForeignKey("stars.id"))
+    source = Column(String) # ExoClock, NASA
+    separation_arcsec = Column(Float, nullable=True) # Positional match distance, if matched by position
+
+    star = relationship("Star")
+
+class PlanetAlias(Base):
+    __tablename__ = "planet_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alias = Column(String, unique=True, index=True)
+    planet_id = Column(Integer, ForeignKey("planets.id"))
+    source = Column(String)
+
+    planet = relationship("Planet")
@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from astropy.coordinates import Angle
+import astropy.units as u
+
+logger = logging.getLogger(__name__)
+
+ADD_TARGET_PATH = "/api/v1/targets/add"
+
+def target_payload(transit):
+    """N.I.N.A. target payload for one transit (coordinates in degrees, J2000)."""
+    return {"Name": transit['planet_name'], "Coordinates": {"RA": float(transit['ra']), "Dec": float(transit['dec'])}}
+
+def _sexagesimal(ra_deg, dec_deg):
+    ra = Angle(ra_deg * u.deg).to_string(unit=u.hourangle, sep=":", precision=1, pad=True)
+    dec = Angle(dec_deg * u.deg).to_string(unit=u.deg, sep=":", precision=0, alwayssign=True, pad=True)
+    return ra, dec
+
+def _window(transit):
+    """Observation window (UTC ISO strings): the planned block if present, else ingress/egress."""
+    start = transit.get('block_start', transit['ingress'])
+    end = transit.get('block_end', transit['egress'])
+    return start.utc.isot, end.utc.isot
+
+def to_framing_csv(transits):
+    """CSV for the N.I.N.A. Framing Assistant / target import (one row per target)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["Name", "RA", "Dec", "RA_deg", "Dec_deg", "Start_UTC", "End_UTC", "Priority"])
+    for t in transits:
+        ra_str, dec_str = _sexagesimal(t['ra'], t['dec'])
+        start, end = _window(t)
+        writer.writerow([t['planet_name'], ra_str, dec_str, f"{t['ra']:.6f}", f"{t['dec']:.6f}", start, end, t.get('priority', '')])
+    return buf.getvalue()
+
+def to_sequence_json(transits):
+    """Sequence target list as JSON: one entry per transit, in the given (time) order."""
+    targets = []
+    for t in transits:
+        ra_str, dec_str = _sexagesimal(t['ra'], t['dec'])
+        start, end = _window(t)
+        entry = target_payload(t)
+        entry["Coordinates"].update({"RAString": ra_str, "DecString": dec_str, "Epoch": "J2000"})
+        entry.update({
+            "Start": start,
+            "End": end,
+            "MidTransit": t['mid_time'].utc.isot,
+            "Priority": t.get('priority'),
+            "Site": t.get('site'),
+            "Telescope": t.get('telescope'),
+        })
+        targets.append(entry)
+    return json.dumps({"Targets": targets}, indent=2)
+
+class NinaClient:
+    """
+    Pushes targets to the N.I.N.A. Advanced API over a pooled HTTP session.
+    Failed connections are retried with backoff (read timeouts and 5xx only for
+    idempotent methods, so a slow N.I.N.A. never gets a target twice); a whole
+    selection is delivered concurrently (bounded by max_workers).
+    """
+
+    def __init__(self, host, port=1888, timeout=5.0, retries=2, max_workers=4, scheme="http"):
+        self.base_url = f"{scheme}://{host}:{port}"
+        self.timeout = timeout
+        self.max_workers = max(1, int(max_workers))
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            # POST /targets/add is not idempotent: once the request may have been sent, don't repeat it
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def push_target(self, transit):
+        """Pushes one target. Returns a status dict and never raises."""
+        payload = target_payload(transit)
+        status = {"name": payload["Name"], "ok": False, "status_code": None, "error": None, "elapsed": 0.0}
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.base_url + ADD_TARGET_PATH, json=payload, timeout=self.timeout)
+            status["status_code"] = response.status_code
+            status["ok"] = response.ok
+            if not response.ok:
+                status["error"] = response.text[:200] or response.reason
+        except requests.RequestException as e:
+            status["error"] = str(e)
+            logger.warning(f"N.I.N.A push failed for {payload['Name']}: {e}")
+        status["elapsed"] = time.perf_counter() - started
+        return status
+
+    def push_targets(self, transits, progress=None):
+        """
+        Pushes a whole selection concurrently.
+        progress: optional callback(done, total) called as targets complete.
+        Returns one status dict per transit, in input order.
+        """
+        results = [None] * len(transits)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.push_target, t): i for i, t in enumerate(transits)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(transits))
+        return results
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from app import fastsky
+from app.scoring import PRIORITY_WEIGHTS
+
+# Above these sizes the figures switch from one glyph per event to aggregates
+MAX_GANTT_EVENTS = 2000
+MAX_SKY_POINTS = 5000
+COUNT_BIN_MIN = 15
+SKY_BIN_ALT = 3.0
+SKY_BIN_AZ = 6.0
+MAX_ROW_LABELS = 60
+
+PRIORITY_COLORS = {
+    "Alert": "#ff4b4b",
+    "High": "#ffa421",
+    "Medium": "#f0e442",
+    "Low": "#21c354",
+    "Normal": "#1c83e1",
+}
+
+def _ms(jd):
+    """JD (UTC) -> milliseconds since the Unix epoch; Plotly date axes take these as numbers."""
+    return (np.asarray(jd, dtype=float) - fastsky.UNIX_EPOCH_JD) * 86400000.0
+
+def overview_frame(transits, sites):
+    """
+    Compact numeric table (one row per event) behind the overview figures:
+    UTC JDs, position and mid-transit alt/az at the event's site.
+    sites: list of dicts with name, lat, lon; the first one is used for rows without a site.
+    """
+    if not transits:
+        return pd.DataFrame()
+    mid = np.array([t["mid_time"].utc.jd for t in transits], dtype=float)
+    half = np.array([t["duration"] or 0.0 for t in transits], dtype=float) / 48.0
+    site_names = [t.get("site") for t in transits]
+    coords = {s["name"]: (s["lat"], s["lon"]) for s in sites}
+    lat, lon = np.array([coords.get(name, (sites[0]["lat"], sites[0]["lon"])) for name in site_names], dtype=float).T
+
+    frame = pd.DataFrame({
+        "planet_name": [t["planet_name"] for t in transits],
+        "site": site_names,
+        "ingress_jd": mid - half,
+        "mid_jd": mid,
+        "egress_jd": mid + half,
+        "ra": np.array([t["ra"] for t in transits], dtype=float),
+        "dec": np.array([t["dec"] for t in transits], dtype=float),
+        "priority": [t.get("priority") or "Normal" for t in transits],
+        "score": np.array([t.get("score", np.nan) for t in transits], dtype=float),
+    })
+    frame["alt"], frame["az"] = fastsky.target_altaz(frame["ra"].to_numpy(), frame["dec"].to_numpy(), mid, lat, lon)
+    return frame
+
+def _rank(frame):
+    """Score, or the priority weight where no score was computed (as in the night planner)."""
+    fallback = 100.0 * frame["priority"].map(PRIORITY_WEIGHTS).fillna(PRIORITY_WEIGHTS["Normal"])
+    return frame["score"].fillna(fallback)
+
+def timeline_figure(frame, max_events=MAX_GANTT_EVENTS):
+    """
+    Top: transits in progress over time (all events, binned).
+    Bottom: Gantt bars from ingress to egress, one row per planet; above
+    max_events only the best-ranked events are drawn.
+    """
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.03)
+
+    # In-progress count at each bin centre: started so far minus finished so far
+    step = COUNT_BIN_MIN / 1440.0
+    centres = np.arange(frame["ingress_jd"].min(), frame["egress_jd"].max() + step, step)
+    counts = (np.searchsorted(np.sort(frame["ingress_jd"].to_numpy()), centres, side="right")
+              - np.searchsorted(np.sort(frame["egress_jd"].to_numpy()), centres, side="left"))
+    fig.add_trace(go.Scattergl(x=_ms(centres), y=counts, mode="lines", line=dict(width=1, color="#aaaaaa"),
+                               fill="tozeroy", name="in progress", showlegend=False,
+                               hovertemplate="%{x|%d.%m %H:%M}: %{y} transits<extra></extra>"), row=1, col=1)
+
+    shown = frame
+    if len(frame) > max_events:
+        shown = frame.loc[_rank(frame).nlargest(max_events).index]
+
+    # Rows ordered by each planet's first ingress
+    order = shown.groupby("planet_name")["ingress_jd"].min().sort_values()
+    row_of = pd.Series(np.arange(len(order)), index=order.index)
+
+    for priority, group in shown.groupby("priority", sort=False):
+        n = len(group)
+        rows = row_of[group["planet_name"]].to_numpy(dtype=float)
+        # One polyline per priority; NaN breaks the line between events
+        x = np.column_stack((_ms(group["ingress_jd"]), _ms(group["egress_jd"]), np.full(n, np.nan))).ravel()
+        y = np.column_stack((rows, rows, np.full(n, np.nan))).ravel()
+        label = group["planet_name"].where(group["site"].isna(), group["planet_name"] + " · " + group["site"].astype(str))
+        text = np.repeat(label.to_numpy(dtype=object), 3)
+        fig.add_trace(go.Scattergl(x=x, y=y, mode="lines", name=priority, text=text,
+                                   line=dict(width=6, color=PRIORITY_COLORS.get(priority, "#888888")),
+                                   hovertemplate="%{text}<br>%{x|%d.%m %H:%M} UTC<extra></extra>"), row=2, col=1)
+
+    labels = len(order) <= MAX_ROW_LABELS
+    fig.update_yaxes(title_text="transits", row=1, col=1)
+    fig.update_yaxes(tickvals=np.arange(len(order)) if labels else None, ticktext=list(order.index) if labels else None,
+                     showticklabels=labels, autorange="reversed", row=2, col=1)
+    fig.update_xaxes(type="date", row=2, col=1)
+    title = f"Timeline: {len(frame)} transits"
+    if len(shown) < len(frame):
+        title += f" (bars: best {len(shown)} by score)"
+    fig.update_layout(title=title, height=max(400, min(900, 120 + 12 * len(order))), margin=dict(l=10, r=10, t=40, b=10),
+                      legend=dict(orientation="h", y=1.02, x=1, xanchor="right", yanchor="bottom"))
+    return fig
+
+def sky_map_figure(frame, max_points=MAX_SKY_POINTS):
+    """
+    Alt-az map of the targets at mid-transit (zenith in the centre, north up,
+    east left). Above max_points events are aggregated into alt/az cells.
+    """
+    fig = go.Figure()
+    if len(frame) <= max_points:
+        for priority, group in frame.groupby("priority", sort=False):
+            fig.add_trace(go.Scatterpolargl(
+                r=90.0 - group["alt"].to_numpy(), theta=group["az"].to_numpy(), mode="markers", name=priority,
+                text=group["planet_name"].to_numpy(dtype=object), customdata=group["alt"].to_numpy(),
+                marker=dict(size=7, color=PRIORITY_COLORS.get(priority, "#888888"), opacity=0.8),
+                hovertemplate="%{text}<br>alt %{customdata:.0f}°, az %{theta:.0f}°<extra></extra>"))
+        title = f"Sky at mid-transit: {len(frame)} transits"
+    else:
+        cells = pd.DataFrame({
+            "alt": np.floor(frame["alt"].to_numpy() / SKY_BIN_ALT) * SKY_BIN_ALT + SKY_BIN_ALT / 2,
+            "az": np.floor(frame["az"].to_numpy() / SKY_BIN_AZ) * SKY_BIN_AZ + SKY_BIN_AZ / 2,
+            "rank": _rank(frame).to_numpy(),
+        }).groupby(["alt", "az"]).agg(count=("rank", "size"), best=("rank", "max")).reset_index()
+        fig.add_trace(go.Scatterpolargl(
+            r=90.0 - cells["alt"].to_numpy(), theta=cells["az"].to_numpy(), mode="markers", name="transits",
+            customdata=np.column_stack((cells["count"], cells["best"])),
+            marker=dict(size=4 + 3 * np.sqrt(cells["count"].to_numpy()), color=cells["best"].to_numpy(),
+                        colorscale="Viridis", showscale=True, colorbar=dict(title="best score"), opacity=0.8),
+            hovertemplate="%{customdata[0]} transits, best score %{customdata[1]:.0f}<extra></extra>"))
+        title = f"Sky at mid-transit: {len(frame)} transits in {len(cells)} cells"
+
+    fig.update_layout(
+        title=title, height=500, margin=dict(l=30, r=30, t=40, b=30),
+        polar=dict(radialaxis=dict(range=[0, 90], tickvals=[0, 30, 60, 90], ticktext=["90°", "60°", "30°", "0°"]),
+                   angularaxis=dict(rotation=90, direction="counterclockwise",
+                                    tickvals=[0, 90, 180, 270], ticktext=["N", "E", "S", "W"])),
+        legend=dict(orientation="h"))
+    return fig
+
+def overview_json(frame):
+    """(timeline, sky map) figures as Plotly JSON, ready to be cached."""
+    if frame.empty:
+        return None, None
+    return timeline_figure(frame).to_json(), sky_map_figure(frame).to_json()
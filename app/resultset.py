@@ -0,0 +1,86 @@
+import numpy as np
+from app.overview import overview_frame
+from app.scoring import estimate_snr, observability_score
+
+# The search computes down to this altitude (or the requested one, if lower);
+# raising min_alt afterwards is a mask, lowering it below this needs a new search
+LOOSE_MIN_ALT = 20.0
+
+def window_key(data_source, start, end, sites):
+    """What a result set depends on besides the filters: data source, time window and sites."""
+    return (data_source, start, end, tuple((s['name'], s['lat'], s['lon'], s['elevation']) for s in sites))
+
+class ResultSet:
+    """
+    Every transit of one search window at loose thresholds (no magnitude, depth,
+    priority, moon or SNR limits; altitude down to min_alt), sorted by mid-time.
+    The filterable attributes are kept column-wise, so tightening a filter is
+    a boolean mask plus a vectorized SNR/score update for the aperture.
+    Records must come from calculate_transits_multi_site with an aperture (for alt_low).
+    """
+
+    def __init__(self, transits, sites, key, min_alt):
+        self.transits = sorted(transits, key=lambda t: t['mid_time'])
+        self.key = key
+        self.min_alt = float(min_alt)
+        transits = self.transits
+
+        def col(name):
+            return np.array([np.nan if t.get(name) is None else t[name] for t in transits], dtype=float)
+
+        self.altitude = col("altitude")
+        self.alt_low = col("alt_low")
+        self.moon_sep = col("moon_sep")
+        self.moon_ill = col("moon_ill")
+        self.mag_v = col("mag_v")
+        self.depth = col("depth")
+        self.duration = col("duration")
+        self.uncertainty_min = col("uncertainty_min")
+        self.min_telescope_in = col("min_telescope_in")
+        self.priority = np.array([t["priority"] for t in transits], dtype=object)
+        elevations = {s['name']: s['elevation'] for s in sites}
+        self.elevation = np.array([elevations.get(t.get("site"), sites[0]['elevation']) for t in transits], dtype=float)
+        self.overview = overview_frame(transits, sites)
+
+    def __len__(self):
+        return len(self.transits)
+
+    def select(self, min_alt=30, max_mag=None, min_depth=None, priorities=None, aperture_in=None,
+               min_snr=0.0, min_moon_sep=0.0):
+        """
+        Same semantics as query_candidates + calculate_transits_multi_site + the aperture
+        filter in the UI. Returns (transit records, number hidden for the aperture, overview frame).
+        Records are shallow copies carrying snr/score for this aperture.
+        """
+        mask = self.altitude >= min_alt
+        # Comparisons with NaN are False, like the SQL filters on NULL columns
+        if max_mag is not None:
+            mask &= self.mag_v <= max_mag
+        if min_depth is not None:
+            mask &= self.depth >= min_depth
+        if priorities:
+            mask &= np.isin(self.priority, list(priorities))
+        if min_moon_sep > 0:
+            mask &= self.moon_sep >= min_moon_sep
+
+        snr = np.full(len(self), np.nan)
+        score = np.full(len(self), np.nan)
+        if aperture_in is not None:
+            snr[mask] = estimate_snr(aperture_in, self.mag_v[mask], self.depth[mask], self.duration[mask],
+                                     self.altitude[mask], self.elevation[mask])
+            mask &= ~(snr < min_snr)
+            score[mask] = observability_score(snr[mask], self.alt_low[mask], self.moon_sep[mask], self.moon_ill[mask],
+                                              self.uncertainty_min[mask], self.duration[mask], self.priority[mask])
+
+        hidden = 0
+        if aperture_in is not None:
+            fits = self.min_telescope_in <= aperture_in
+            hidden = int(np.count_nonzero(mask & ~fits))
+            mask &= fits
+
+        rows = np.flatnonzero(mask)
+        transits = [{**self.transits[i], "snr": snr[i], "score": score[i]} for i in rows]
+        frame = self.overview.iloc[rows].reset_index(drop=True) if len(self.overview) else self.overview
+        if len(frame):
+            frame = frame.assign(score=score[rows])
+        return transits, hidden, frame
@@ -0,0 +1,111 @@
+import bisect
+import numpy as np
+import astropy.units as u
+from app.scoring import PRIORITY_WEIGHTS
+
+def night_of(jd, longitude=0.0):
+    """
+    Integer night id (JD of the local noon starting that night) for JD_UTC values.
+    Nights run noon to noon in local mean solar time at the given longitude (deg, east positive).
+    """
+    # Integer JDs fall on noon UTC, so shifting to local mean time and flooring lands on local noon
+    return np.floor(np.asarray(jd, dtype=float) + np.asarray(longitude) / 360.0).astype(int)
+
+def event_weight(transit):
+    """Scheduling weight: observability score, or the priority weight if no score is available."""
+    score = transit.get("score")
+    if score is not None and np.isfinite(score):
+        return float(score)
+    return 100.0 * PRIORITY_WEIGHTS.get(transit.get("priority"), PRIORITY_WEIGHTS["Normal"])
+
+def weighted_interval_schedule(starts, ends, weights):
+    """
+    Classic weighted interval scheduling in O(n log n).
+    Intervals are half-open [start, end); returns the chosen indices in time order.
+    """
+    n = len(starts)
+    if n == 0:
+        return []
+
+    order = sorted(range(n), key=lambda i: ends[i])
+    sorted_ends = [ends[i] for i in order]
+
+    # p[j]: number of intervals (in end order) that finish before interval j starts
+    p = [bisect.bisect_right(sorted_ends, starts[i]) for i in order]
+
+    best = [0.0] * (n + 1)
+    for j in range(1, n + 1):
+        best[j] = max(best[j - 1], weights[order[j - 1]] + best[p[j - 1]])
+
+    chosen = []
+    j = n
+    while j > 0:
+        i = order[j - 1]
+        if weights[i] + best[p[j - 1]] >= best[j - 1]:
+            chosen.append(i)
+            j = p[j - 1]
+        else:
+            j -= 1
+    return chosen[::-1]
+
+def plan_nights(transits, baseline_min=30.0, slew_min=5.0, telescopes=1, longitude=0.0):
+    """
+    Builds a night plan from found transits: for every (site, night) it picks
+    the non-overlapping set of transits with the highest total weight.
+    Each block covers ingress - baseline to egress + baseline; consecutive
+    blocks on one telescope must be separated by at least slew_min.
+
+    With telescopes > 1 the optimal single-telescope plan is taken for the
+    first telescope, its events removed, and the rest planned for the next
+    one (greedy, not a joint optimum).
+    longitude: site longitude (deg) used to split nights, or a dict keyed by site name.
+
+    Returns the chosen transits (copies) in time order with added keys
+    'night', 'telescope', 'block_start' and 'block_end' (astropy Time).
+    """
+    if not transits:
+        return []
+
+    ingress_jd = np.array([t["ingress"].jd for t in transits])
+    egress_jd = np.array([t["egress"].jd for t in transits])
+    baseline = baseline_min / 1440.0
+    slew = slew_min / 1440.0
+
+    block_start = ingress_jd - baseline
+    # The slew margin is folded into the block end so plain interval overlap applies
+    block_end = egress_jd + baseline + slew
+    weights = [event_weight(t) for t in transits]
+    if isinstance(longitude, dict):
+        site_lon = np.array([longitude.get(t.get("site"), 0.0) for t in transits])
+    else:
+        site_lon = longitude
+    nights = night_of(ingress_jd, site_lon)
+
+    groups = {}
+    for i, t in enumerate(transits):
+        groups.setdefault((t.get("site"), int(nights[i])), []).append(i)
+
+    plan = []
+    for (site, night), members in groups.items():
+        remaining = members
+        for telescope in range(1, telescopes + 1):
+            if not remaining:
+                break
+            picked = weighted_interval_schedule(
+                [block_start[i] for i in remaining],
+                [block_end[i] for i in remaining],
+                [weights[i] for i in remaining]
+            )
+            picked_idx = [remaining[k] for k in picked]
+            for i in picked_idx:
+                entry = dict(transits[i])
+                entry["night"] = night
+                entry["telescope"] = telescope
+                entry["block_start"] = transits[i]["ingress"] - baseline_min * u.min
+                entry["block_end"] = transits[i]["egress"] + baseline_min * u.min
+                plan.append(entry)
+            chosen = set(picked_idx)
+            remaining = [i for i in remaining if i not in chosen]
+
+    plan.sort(key=lambda e: (e["block_start"].jd, e["telescope"]))
+    return plan
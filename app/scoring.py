@@ -0,0 +1,74 @@
+import numpy as np
+
+# Photometric model constants (V band)
+V_ZERO_POINT = 8.8e5      # photons / s / cm^2 for V=0 across the V passband
+THROUGHPUT = 0.4          # optics + filter + detector QE
+CENTRAL_OBSTRUCTION = 0.3 # secondary mirror diameter as fraction of aperture
+EXTINCTION_V = 0.2        # mag / airmass
+SYSTEMATIC_FLOOR = 5e-4   # relative noise floor over the whole transit (flat-field, guiding, etc.)
+SNR_REFERENCE = 10.0      # SNR at which the SNR part of the score saturates
+
+PRIORITY_WEIGHTS = {"Alert": 1.0, "High": 0.85, "Medium": 0.6, "Low": 0.4, "Normal": 0.3}
+
+# Composite observability score weights (sum to 1)
+SCORE_WEIGHTS = {"snr": 0.3, "altitude": 0.2, "moon": 0.15, "timing": 0.15, "priority": 0.2}
+
+def airmass(altitude):
+    """Kasten & Young (1989) airmass for an array of altitudes in degrees. NaN below the horizon."""
+    alt = np.asarray(altitude, dtype=float)
+    x = 1.0 / (np.sin(np.radians(alt)) + 0.50572 * (alt + 6.07995) ** -1.6364)
+    return np.where(alt > 0, x, np.nan)
+
+def estimate_snr(aperture_in, mag_v, depth_mmag, duration_h, altitude, elevation=0.0):
+    """
+    Expected SNR of the transit depth, comparing the in-transit flux against an
+    equally long out-of-transit baseline. Photon, scintillation (Young 1967) and a
+    systematic floor are included. All arguments may be arrays; unknown
+    magnitudes (None, NaN or <= 0) give NaN.
+    """
+    mag = np.asarray(mag_v, dtype=float)
+    mag = np.where(mag > 0, mag, np.nan)
+    depth_frac = 1.0 - 10 ** (-np.asarray(depth_mmag, dtype=float) / 2500.0)
+    t_sec = np.maximum(np.asarray(duration_h, dtype=float), 0.0) * 3600.0
+    x = airmass(altitude)
+
+    d_cm = np.asarray(aperture_in, dtype=float) * 2.54
+    area = np.pi * (d_cm / 2.0) ** 2 * (1.0 - CENTRAL_OBSTRUCTION ** 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        photons = V_ZERO_POINT * 10 ** (-0.4 * (mag + EXTINCTION_V * x)) * area * THROUGHPUT * t_sec
+        sigma_phot = 1.0 / np.sqrt(photons)
+        sigma_scint = 0.09 * d_cm ** (-2.0 / 3.0) * x ** 1.75 * np.exp(-elevation / 8000.0) / np.sqrt(2.0 * t_sec)
+        sigma = np.sqrt(sigma_phot ** 2 + sigma_scint ** 2 + SYSTEMATIC_FLOOR ** 2)
+        return depth_frac / (sigma * np.sqrt(2.0))
+
+def observability_score(snr, altitude, moon_sep, moon_ill, uncertainty_min, duration_h, priority):
+    """
+    Composite 0-100 score from SNR, altitude profile, moon context, timing
+    uncertainty and ExoClock priority. Arrays in, array out.
+    altitude: lowest altitude over the transit (ingress/mid/egress) in degrees.
+    """
+    snr = np.asarray(snr, dtype=float)
+    snr_term = np.where(np.isfinite(snr), np.clip(snr / SNR_REFERENCE, 0.0, 1.0), 0.5)
+
+    alt = np.asarray(altitude, dtype=float)
+    alt_term = np.clip(np.sin(np.radians(alt)) / np.sin(np.radians(60.0)), 0.0, 1.0)
+
+    # A bright moon close to the target hurts most; illumination fades the penalty
+    sep = np.nan_to_num(np.asarray(moon_sep, dtype=float), nan=180.0)
+    ill = np.nan_to_num(np.asarray(moon_ill, dtype=float), nan=0.0)
+    moon_term = 1.0 - ill * np.exp(-sep / 30.0)
+
+    # Uncertainty relative to the transit duration: +-1/2 duration halves the term
+    unc_h = np.nan_to_num(np.asarray(uncertainty_min, dtype=float), nan=0.0) / 60.0
+    dur_h = np.maximum(np.asarray(duration_h, dtype=float), 1e-3)
+    timing_term = 1.0 / (1.0 + (2.0 * unc_h / dur_h) ** 2)
+
+    prio_term = np.array([PRIORITY_WEIGHTS.get(p, PRIORITY_WEIGHTS["Normal"]) for p in np.atleast_1d(priority)])
+
+    score = (SCORE_WEIGHTS["snr"] * snr_term
+             + SCORE_WEIGHTS["altitude"] * alt_term
+             + SCORE_WEIGHTS["moon"] * moon_term
+             + SCORE_WEIGHTS["timing"] * timing_term
+             + SCORE_WEIGHTS["priority"] * prio_term)
+    return 100.0 * score
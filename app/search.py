@@ -0,0 +1,59 @@
+import time
+from astropy.time import Time
+from app.models import Planet, Star
+from app.logic import get_observer, calculate_transits_multi_site
+from app.sky_index import get_sky_index, prefilter_candidates
+from app.visibility import season_filter
+from app import metrics
+
+def query_candidates(db, max_mag=None, min_depth=None, priorities=None, planet_name=None):
+    """
+    Static (SQL) pre-filter. Returns Planet objects with the host star's
+    ra, dec and mag_v attached, ready for the transit engine.
+    """
+    query = db.query(Planet, Star).join(Star)
+    if max_mag is not None:
+        query = query.filter(Star.mag_v <= max_mag)
+    if min_depth is not None:
+        query = query.filter(Planet.depth_mmag >= min_depth)
+    if priorities:
+        query = query.filter(Planet.priority.in_(priorities))
+    if planet_name:
+        query = query.filter(Planet.name == planet_name)
+
+    planets = []
+    for planet, star in query.all():
+        planet.ra = star.ra
+        planet.dec = star.dec
+        planet.mag_v = star.mag_v
+        planets.append(planet)
+    return planets
+
+def search_transits(session_factory, start, end, sites, min_alt=30, max_mag=None, min_depth=None,
+                    priorities=None, aperture_in=None, min_snr=0.0, min_moon_sep=0.0, planet_name=None):
+    """
+    Full search (SQL pre-filter + batched transit engine) outside of Streamlit.
+    start/end: datetimes (UTC); sites: list of dicts with name, lat, lon, elevation.
+    Returns time-sorted transit records; events needing a larger aperture are dropped.
+    """
+    started = time.perf_counter()
+    db = session_factory()
+    try:
+        planets = query_candidates(db, max_mag, min_depth, priorities, planet_name)
+    finally:
+        db.close()
+
+    t_start, t_end = Time(start), Time(end)
+    observers = [get_observer(s['lat'], s['lon'], s['elevation'], name=s['name']) for s in sites]
+    planets, _ = season_filter(planets, session_factory, sites, t_start.utc.jd, t_end.utc.jd, min_alt)
+    planets, _, _ = prefilter_candidates(planets, get_sky_index(session_factory), observers, t_start, t_end,
+                                         min_alt=min_alt, min_moon_sep=min_moon_sep)
+    metrics.SEARCH_CANDIDATES.observe(len(planets), source="service")
+    transits = calculate_transits_multi_site(planets, t_start, t_end, observers, min_alt=min_alt,
+                                             aperture_in=aperture_in, min_snr=min_snr, min_moon_sep=min_moon_sep)
+    if aperture_in is not None:
+        transits = [t for t in transits if t.get('min_telescope_in', 0) <= aperture_in]
+    transits.sort(key=lambda x: x['mid_time'])
+    metrics.SEARCH_EVENTS.observe(len(transits), source="service")
+    metrics.SEARCH_SECONDS.observe(time.perf_counter() - started, source="service")
+    return transits
@@ -0,0 +1,145 @@
+import time
+import threading
+import logging
+import numpy as np
+from scipy.spatial import cKDTree
+from astropy.coordinates import get_body
+import astropy.units as u
+from app.models import Star
+from app.crossmatch import unit_vectors, chord
+from app import fastsky
+from app.jobs import register_refresh_hook
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rebuild at least this often so refreshes done by another process are picked up
+INDEX_MAX_AGE = 3600.0
+# Star coordinates are J2000; precession to date (~0.4 deg) plus LST/refraction slop
+POSITION_MARGIN = 1.0
+SAMPLE_STEP_MIN = 30.0
+# deg / day: fastest apparent motion of the moon (perigee, ~15.3), not the mean 13.2, so the
+# moon-conflict radius never assumes less motion than really happens during the window
+MOON_RATE = 15.5
+
+class SkyIndex:
+    """
+    k-d tree over star unit vectors for cone and altitude-band queries.
+    All queries return arrays of Star ids.
+    """
+
+    def __init__(self, star_ids, ra, dec):
+        self.star_ids = np.asarray(star_ids, dtype=int)
+        self.built = time.time()
+        self.tree = cKDTree(unit_vectors(ra, dec)) if len(self.star_ids) else None
+
+    def __len__(self):
+        return len(self.star_ids)
+
+    @classmethod
+    def from_session(cls, db):
+        rows = db.query(Star.id, Star.ra, Star.dec).filter(Star.ra.isnot(None), Star.dec.isnot(None)).all()
+        ids, ra, dec = zip(*rows) if rows else ((), (), ())
+        return cls(ids, ra, dec)
+
+    def cone(self, ra, dec, radius_deg):
+        """Stars within radius_deg of (ra, dec). ra/dec may be arrays: union of all cones."""
+        if self.tree is None:
+            return np.empty(0, dtype=int)
+        centers = unit_vectors(np.atleast_1d(ra), np.atleast_1d(dec))
+        hits = self.tree.query_ball_point(centers, chord(radius_deg))
+        if len(hits) == 0:
+            return np.empty(0, dtype=int)
+        idx = np.unique(np.concatenate([np.asarray(h, dtype=int) for h in hits]))
+        return self.star_ids[idx]
+
+    def band(self, zenith_ra, zenith_dec, min_alt, max_alt=90.0):
+        """Stars with min_alt <= altitude <= max_alt for the given zenith position (no refraction)."""
+        outer = self.cone(zenith_ra, zenith_dec, 90.0 - min_alt)
+        if max_alt >= 90.0:
+            return outer
+        inner = self.cone(zenith_ra, zenith_dec, 90.0 - max_alt)
+        return np.setdiff1d(outer, inner, assume_unique=True)
+
+    def visible_during(self, observer, times, min_alt, margin_deg=POSITION_MARGIN):
+        """Stars above min_alt (less margin_deg) at any of the given times."""
+        zenith_ra = fastsky.gmst_deg(times.utc.jd) + observer.location.lon.deg
+        zenith_dec = np.full(len(zenith_ra), observer.location.lat.deg)
+        return self.cone(zenith_ra, zenith_dec, 90.0 - min_alt + margin_deg)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _cache_key(session_factory):
+    return str(session_factory.kw["bind"].url)
+
+def get_sky_index(session_factory):
+    """Cached SkyIndex for a database; built on first use and after each catalog refresh."""
+    key = _cache_key(session_factory)
+    metrics.CACHE_LOOKUPS.inc(cache="sky_index")
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is None or time.time() - index.built > INDEX_MAX_AGE:
+            metrics.CACHE_MISSES.inc(cache="sky_index")
+            db = session_factory()
+            try:
+                index = SkyIndex.from_session(db)
+            finally:
+                db.close()
+            _cache[key] = index
+            logger.info(f"Built sky index with {len(index)} stars")
+        return index
+
+@register_refresh_hook
+def rebuild_sky_index(session_factory, progress=None):
+    """Refresh hook: drops the cached index and rebuilds it from the updated catalog."""
+    with _cache_lock:
+        _cache.pop(_cache_key(session_factory), None)
+    get_sky_index(session_factory)
+
+def prefilter_candidates(planets, index, observers, start_time, end_time, min_alt=30, max_sun_alt=-6, min_moon_sep=0.0):
+    """
+    Cheap sky-position screening before the transit engine.
+    Rejects hosts that are below min_alt at every dark sample time (and its neighbours) at every site,
+    and hosts that stay within min_moon_sep of the moon for the whole window.
+    Returns (kept planets, number rejected out-of-sky, number rejected for the moon).
+    """
+    if not planets or index is None or len(index) == 0:
+        return planets, 0, 0
+
+    step = SAMPLE_STEP_MIN / 1440.0
+    n_samples = max(2, int(np.ceil((end_time.jd - start_time.jd) / step)) + 1)
+    times = start_time + np.linspace(0.0, end_time.jd - start_time.jd, n_samples) * u.day
+    jd_utc = times.utc.jd
+
+    # Sidereal motion to the nearest sample is covered by widening every cone
+    margin = POSITION_MARGIN + 360.0 * 1.0027379 * step / 2.0
+    visible = []
+    for observer in observers:
+        sun_alt = fastsky.sun_altitude(jd_utc, observer.location.lat.deg, observer.location.lon.deg)
+        dark = sun_alt <= max_sun_alt + fastsky.ERROR_BOUND_DEG
+        # Near the twilight limit the sample nearest to a dark event can still be too bright:
+        # also check one sample on each side of every dark one, so the nearest is always included
+        checked = dark.copy()
+        checked[1:] |= dark[:-1]
+        checked[:-1] |= dark[1:]
+        if checked.any():
+            visible.append(index.visible_during(observer, times[checked], min_alt, margin))
+    visible = set(np.concatenate(visible).tolist()) if visible else set()
+
+    conflicted = set()
+    if min_moon_sep > 0:
+        mid = start_time + (end_time - start_time) / 2
+        moon = get_body("moon", mid)
+        half_window = (end_time.jd - start_time.jd) / 2.0
+        # Only stars that cannot leave the conflict zone during the window (parallax < 1 deg)
+        radius = min_moon_sep - MOON_RATE * half_window - 1.0
+        if radius > 0:
+            conflicted = set(index.cone(moon.ra.deg, moon.dec.deg, radius).tolist())
+
+    kept = [p for p in planets if p.star_id in visible and p.star_id not in conflicted]
+    out_of_sky = sum(1 for p in planets if p.star_id not in visible)
+    moon_conflicts = len(planets) - len(kept) - out_of_sky
+    metrics.PREFILTER_REJECTED.inc(out_of_sky, reason="out_of_sky")
+    metrics.PREFILTER_REJECTED.inc(moon_conflicts, reason="moon")
+    return kept, out_of_sky, moon_conflicts
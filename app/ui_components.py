@@ -1,4 +1,12 @@
 import streamlit as st
+from datetime import datetime, timezone
+from app.database import get_session_factory
+from app.live import build_tonight, night_window, to_jd
+from app.overview import overview_json
+from app.visibility import get_calendar
+from app import metrics
+import plotly.graph_objects as go
+import plotly.io as pio
 
 def apply_theme(theme_mode):
     """
@@ -57,6 +65,24 @@ def apply_theme(theme_mode):
     if css:
         st.markdown(css, unsafe_allow_html=True)
 
+def parse_sites(text):
+    """Parses 'name, lat, lon, elevation' lines into site dicts. Invalid lines are skipped."""
+    sites = []
+    for line in text.splitlines():
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) < 3 or not parts[0]:
+            continue
+        try:
+            sites.append({
+                "name": parts[0],
+                "lat": float(parts[1]),
+                "lon": float(parts[2]),
+                "elevation": float(parts[3]) if len(parts) > 3 and parts[3] else 0.0
+            })
+        except ValueError:
+            st.sidebar.warning(f"Ignoring invalid site line: {line}")
+    return sites
+
 def render_sidebar():
     st.sidebar.header("Configuration")
     
@@ -65,6 +91,16 @@ def render_sidebar():
     lat = st.sidebar.number_input("Latitude", value=48.0880, step=0.1, format="%.4f")
     lon = st.sidebar.number_input("Longitude", value=15.7566, step=0.1, format="%.4f")
     elevation = st.sidebar.number_input("Elevation (m)", value=640, step=10)
+
+    # Additional sites for a network search (Home site is always included)
+    sites_text = st.sidebar.text_area(
+        "Network Sites (name, lat °, lon °, elevation m)",
+        value="",
+        placeholder="Remote, 47.2500, 11.3900, 900",
+        help="One additional site per line. All sites are searched in a single pass."
+    )
+    sites = [{"name": "Home", "lat": lat, "lon": lon, "elevation": elevation}]
+    sites.extend(parse_sites(sites_text))
     
     # Equipment
     st.sidebar.subheader("Equipment")
@@ -80,6 +116,123 @@ def render_sidebar():
         "lat": lat,
         "lon": lon,
         "elevation": elevation,
+        "sites": sites,
         "aperture": aperture,
         "theme": theme
     }
+
+def render_job_status(runner, kind):
+    """Sidebar status for a background job; polls every 2 s while the job is queued or running."""
+    job = runner.latest(kind)
+    active = job is not None and job["status"] in ("queued", "running")
+
+    @st.fragment(run_every=2 if active else None)
+    def status_panel():
+        job = runner.latest(kind)
+        next_run = runner.next_scheduled(kind)
+        if job is None:
+            st.caption("No catalog refresh has run since the server started.")
+        elif job["status"] in ("queued", "running"):
+            st.progress(job["progress"], text=job["message"])
+        elif job["status"] == "done":
+            st.caption(f"Last refresh finished {job['finished'].strftime('%d.%m.%Y %H:%M')}")
+            merges = (job["result"] or {}).get("merges") or []
+            if merges:
+                with st.expander(f"{len(merges)} cross-match merges"):
+                    st.dataframe(merges, hide_index=True)
+        else:
+            st.error(f"Refresh failed: {job['error']}")
+        if next_run:
+            st.caption(f"Next weekly refresh: {next_run.strftime('%a %d.%m.%Y %H:%M')}")
+
+        # Leave polling mode with a full rerun once the job has finished
+        status = job["status"] if job else None
+        if active and status not in ("queued", "running"):
+            st.rerun(scope="app")
+
+    with st.sidebar:
+        status_panel()
+
+@st.cache_resource(max_entries=16, show_spinner="Computing tonight's transits...")
+def _tonight_plan(data_source, site, night, filters):
+    """One TonightPlan per (database, site, night, filters), shared by all sessions."""
+    metrics.CACHE_MISSES.inc(cache="tonight_plan")
+    site = dict(site)
+    # Any JD inside the night selects it
+    return build_tonight(get_session_factory(data_source), site, night - site["lon"] / 360.0 + 0.5, **dict(filters))
+
+def render_tonight(data_source, site, filters, horizon_h=6.0, refresh_s=60):
+    """
+    Live "Tonight" table for one site. The night's transits are computed once;
+    every refresh only advances the cached plan to the current time.
+    """
+    site_key = tuple(site.items())
+    filter_key = tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(filters.items()))
+
+    @st.fragment(run_every=refresh_s)
+    def live_panel():
+        now = datetime.now(timezone.utc)
+        now_jd = to_jd(now)
+        night, _, _ = night_window(now_jd, site["lon"])
+        metrics.CACHE_LOOKUPS.inc(cache="tonight_plan")
+        plan = _tonight_plan(data_source, site_key, night, filter_key)
+        events = plan.tick(now_jd, horizon_h)
+
+        st.caption(f"{site['name']} · {now.strftime('%H:%M:%S')} UTC · Sun {plan.sun_altitude(now_jd):+.1f}° · "
+                   f"{len(events)} of {len(plan)} transits tonight in progress or within {horizon_h:g} h")
+        if events.empty:
+            st.info("No more transits tonight within the look-ahead window.")
+            return
+        st.dataframe(
+            events[["planet_name", "status", "starts_in_min", "progress", "ingress", "egress", "alt_now",
+                    "altitude", "depth", "mag_v", "priority", "score"]],
+            column_config={
+                "starts_in_min": st.column_config.NumberColumn("starts in (min)", format="%d"),
+                "progress": st.column_config.ProgressColumn("progress", min_value=0.0, max_value=1.0),
+                "ingress": st.column_config.DatetimeColumn("ingress (UTC)", format="HH:mm"),
+                "egress": st.column_config.DatetimeColumn("egress (UTC)", format="HH:mm"),
+                "alt_now": st.column_config.NumberColumn("alt now (°)", format="%.1f"),
+                "altitude": st.column_config.NumberColumn("alt mid (°)", format="%.1f"),
+                "depth": st.column_config.NumberColumn(format="%.2f"),
+                "mag_v": st.column_config.NumberColumn(format="%.1f"),
+                "score": st.column_config.NumberColumn(format="%.0f"),
+            },
+            hide_index=True,
+            width="stretch",
+        )
+
+    live_panel()
+
+@st.cache_data(max_entries=8, show_spinner="Building overview...")
+def _overview_json(frame):
+    metrics.CACHE_MISSES.inc(cache="overview")
+    return overview_json(frame)
+
+def render_overview(frame):
+    """All-results timeline and sky map (WebGL traces, figure JSON cached per result set)."""
+    metrics.CACHE_LOOKUPS.inc(cache="overview")
+    timeline, sky_map = _overview_json(frame)
+    if timeline is None:
+        return
+    col_timeline, col_sky = st.columns([3, 2])
+    with col_timeline:
+        st.plotly_chart(pio.from_json(timeline), width="stretch")
+    with col_sky:
+        st.plotly_chart(pio.from_json(sky_map), width="stretch")
+
+def render_season_strip(session_factory, site, star_id, mark_date=None, template="plotly_dark"):
+    """Hours per night above the calendar's altitude limit in astronomical darkness, for the next year."""
+    calendar = get_calendar(session_factory, site)
+    season = calendar.season(star_id) if calendar is not None and star_id is not None else None
+    if season is None:
+        st.caption("Season strip appears once the visibility calendar for this site is built (runs in the background).")
+        return
+    dates, hours = season
+    fig = go.Figure(go.Bar(x=dates, y=hours, marker_color="#1c83e1", marker_line_width=0,
+                           hovertemplate="%{x|%d.%m.%Y}: %{y:.2f} h<extra></extra>"))
+    if mark_date is not None:
+        fig.add_vline(x=mark_date.strftime("%Y-%m-%d"), line=dict(color="orange", width=2, dash="dot"))
+    fig.update_layout(title=dict(text=f"Season at {site['name']}: dark hours above {calendar.min_alt:.0f}°"),
+                      yaxis=dict(title="hours", range=[0, max(1.0, float(hours.max()))]), bargap=0,
+                      template=template, margin=dict(l=20, r=20, t=40, b=20), height=220)
+    st.plotly_chart(fig, width="stretch")
@@ -0,0 +1,241 @@
+import os
+import glob
+import time
+import hashlib
+import logging
+import threading
+import numpy as np
+from app import fastsky
+from app.models import Star
+from app.scheduler import night_of
+from app.jobs import register_refresh_hook
+from app.resultset import LOOSE_MIN_ALT
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_DIR = os.getenv("VISIBILITY_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                          "visibility"))
+VISIBILITY_MIN_ALT = float(os.getenv("VISIBILITY_MIN_ALT", "30"))
+CALENDAR_NIGHTS = 366
+SAMPLES_PER_NIGHT = 96 # quarter-hours, noon to noon
+DARK_SUN_ALT = -18.0
+# Season screening for searches: the search's twilight limit, widened by what a target
+# or the sun can move between two samples (15 deg/h * 15 min) so no visible event is skipped.
+# It covers searches down to SCREEN_MIN_ALT, which includes the UI's loose search.
+SCREEN_SUN_ALT = -6.0
+SCREEN_MIN_ALT = LOOSE_MIN_ALT
+SAMPLE_MARGIN = 4.0
+CHUNK_NIGHTS = 16
+REBUILD_AFTER_NIGHTS = 30 # Rolling calendars start at the night they were built
+
+def db_key(session_factory):
+    return hashlib.sha1(str(session_factory.kw["bind"].url).encode()).hexdigest()[:10]
+
+def site_key(site):
+    return f"{site['lat']:+08.3f}_{site['lon']:+09.3f}"
+
+def calendar_path(session_factory, site):
+    return os.path.join(VISIBILITY_DIR, f"{db_key(session_factory)}_{site_key(site)}.npz")
+
+class VisibilityCalendar:
+    """
+    Per-site, per-star visibility for every night of a year, as uint8 arrays
+    [star, night] of quarter-hours:
+      dark_qh   - above min_alt while the sun is below -18 deg (the season strip)
+      screen_qh - above screen_alt - 4 deg while the sun is below -2 deg (a superset
+                  of anything a search down to screen_alt can find, used to skip targets)
+    Night n runs from local noon of night id first_night + n (see scheduler.night_of).
+    """
+
+    def __init__(self, site, star_ids, first_night, dark_qh, screen_qh, min_alt, screen_alt, built=None):
+        self.site = site
+        self.star_ids = np.asarray(star_ids, dtype=np.int64)
+        self.first_night = int(first_night)
+        self.dark_qh = dark_qh
+        self.screen_qh = screen_qh
+        self.min_alt = float(min_alt)
+        self.screen_alt = float(screen_alt)
+        self.built = built or time.time()
+        self._row = {int(s): i for i, s in enumerate(self.star_ids)}
+
+    @property
+    def n_nights(self):
+        return self.dark_qh.shape[1]
+
+    @classmethod
+    def build(cls, site, star_ids, ra, dec, first_night, nights=CALENDAR_NIGHTS, min_alt=VISIBILITY_MIN_ALT,
+              screen_alt=SCREEN_MIN_ALT):
+        """One vectorized pass: sun and sidereal time per sample, altitudes as a [star, sample] matrix."""
+        ra = np.asarray(ra, dtype=float)
+        dec = np.asarray(dec, dtype=float)
+        lat, lon = site["lat"], site["lon"]
+        dark_qh = np.zeros((len(ra), nights), dtype=np.uint8)
+        screen_qh = np.zeros((len(ra), nights), dtype=np.uint8)
+
+        # Precession over one year is < 0.02 deg: precess once to the middle of the calendar
+        start_jd = first_night - lon / 360.0
+        ra_d, dec_d = fastsky.precess_from_j2000(ra, dec, start_jd + nights / 2.0)
+        sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+        sin_dec = np.sin(np.radians(dec_d))
+        cos_dec_cos_ra = np.cos(np.radians(dec_d)) * np.cos(np.radians(ra_d))
+        cos_dec_sin_ra = np.cos(np.radians(dec_d)) * np.sin(np.radians(ra_d))
+        sin_min_alt = np.sin(np.radians(min_alt))
+        screen_alt = min(screen_alt, min_alt)
+        sin_screen_alt = np.sin(np.radians(screen_alt - SAMPLE_MARGIN))
+
+        for first in range(0, nights, CHUNK_NIGHTS):
+            n = min(CHUNK_NIGHTS, nights - first)
+            jd = start_jd + first + (np.arange(n * SAMPLES_PER_NIGHT) + 0.5) / SAMPLES_PER_NIGHT
+            sun_alt = fastsky.sun_altitude(jd, lat, lon)
+            screen = sun_alt <= SCREEN_SUN_ALT + SAMPLE_MARGIN
+            if not screen.any():
+                continue
+            jd, sun_alt = jd[screen], sun_alt[screen]
+            night = np.flatnonzero(screen) // SAMPLES_PER_NIGHT
+
+            # sin(alt) = sin(lat) sin(dec) + cos(lat) cos(dec) cos(LST - ra), expanded so it is one outer product
+            lst = np.radians(fastsky.gmst_deg(jd) + lon)
+            sin_alt = sin_lat * sin_dec[:, None] + cos_lat * (np.outer(cos_dec_cos_ra, np.cos(lst))
+                                                              + np.outer(cos_dec_sin_ra, np.sin(lst)))
+            # Per-night sums via cumulative sums at the night boundaries
+            bounds = np.searchsorted(night, np.arange(n + 1))
+            for target, mask in ((screen_qh, sin_alt >= sin_screen_alt),
+                                 (dark_qh, (sin_alt >= sin_min_alt) & (sun_alt <= DARK_SUN_ALT))):
+                cum = np.concatenate((np.zeros((len(ra), 1), dtype=np.int32), np.cumsum(mask, axis=1, dtype=np.int32)), axis=1)
+                target[:, first:first + n] = np.diff(cum[:, bounds], axis=1)
+        return cls(site, star_ids, first_night, dark_qh, screen_qh, min_alt, screen_alt)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, star_ids=self.star_ids, first_night=self.first_night, dark_qh=self.dark_qh,
+                            screen_qh=self.screen_qh, min_alt=self.min_alt, screen_alt=self.screen_alt,
+                            built=self.built,
+                            site=np.array([self.site["name"], self.site["lat"], self.site["lon"]], dtype=object))
+        os.replace(tmp, path) # Readers never see a half-written file
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as data:
+            name, lat, lon = data["site"]
+            # Files from before screen_alt was stored screened at min_alt
+            screen_alt = data["screen_alt"] if "screen_alt" in data.files else data["min_alt"]
+            return cls({"name": str(name), "lat": float(lat), "lon": float(lon)}, data["star_ids"],
+                       int(data["first_night"]), data["dark_qh"], data["screen_qh"], float(data["min_alt"]),
+                       float(screen_alt), float(data["built"]))
+
+    def night_columns(self, start_jd, end_jd):
+        """Calendar columns of the nights touching [start_jd, end_jd], or None if outside the calendar."""
+        first = int(night_of(start_jd, self.site["lon"])) - self.first_night
+        last = int(night_of(end_jd, self.site["lon"])) - self.first_night
+        if first < 0 or last >= self.n_nights:
+            return None
+        return slice(first, last + 1)
+
+    def in_season(self, star_ids, start_jd, end_jd, min_alt):
+        """
+        False for stars that certainly cannot be above min_alt in the dark during
+        the window. Unknown stars, nights outside the calendar and searches below
+        screen_alt are always True.
+        """
+        star_ids = np.asarray(star_ids, dtype=np.int64)
+        keep = np.ones(len(star_ids), dtype=bool)
+        cols = self.night_columns(start_jd, end_jd)
+        if cols is None or min_alt < self.screen_alt:
+            return keep
+        rows = np.array([self._row.get(int(s), -1) for s in star_ids], dtype=np.int64)
+        known = rows >= 0
+        keep[known] = self.screen_qh[rows[known], cols].any(axis=1)
+        return keep
+
+    def season(self, star_id):
+        """(night start dates as datetime64, hours above min_alt in astronomical darkness) for one star."""
+        row = self._row.get(int(star_id))
+        if row is None:
+            return None
+        nights = self.first_night + np.arange(self.n_nights) - self.site["lon"] / 360.0
+        dates = ((nights - fastsky.UNIX_EPOCH_JD) * 86400.0).astype("datetime64[s]").astype("datetime64[D]")
+        return dates, self.dark_qh[row] / 4.0
+
+def build_calendar(session_factory, site, first_night=None, progress=None):
+    """Builds, saves and caches the calendar of a site from the current catalog, starting tonight."""
+    db = session_factory()
+    try:
+        rows = db.query(Star.id, Star.ra, Star.dec).filter(Star.ra.isnot(None), Star.dec.isnot(None)).all()
+    finally:
+        db.close()
+    if first_night is None:
+        first_night = int(night_of(time.time() / 86400.0 + fastsky.UNIX_EPOCH_JD, site["lon"]))
+    if progress:
+        progress(None, f"Visibility calendar for {site['name']} ({len(rows)} stars)...")
+    ids, ra, dec = zip(*rows) if rows else ((), (), ())
+
+    started = time.perf_counter()
+    calendar = VisibilityCalendar.build(site, ids, ra, dec, first_night)
+    path = calendar_path(session_factory, site)
+    calendar.save(path)
+    with _cache_lock:
+        _cache[path] = calendar
+    logger.info(f"Built visibility calendar for {site['name']} in {time.perf_counter() - started:.1f} s -> {path}")
+    return path
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_calendar(session_factory, site):
+    """Cached calendar of a site (loaded from disk), or None if none was built yet."""
+    path = calendar_path(session_factory, site)
+    metrics.CACHE_LOOKUPS.inc(cache="visibility")
+    with _cache_lock:
+        calendar = _cache.get(path)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if mtime is None:
+            return None
+        # Another process (the job worker of the API, say) may have rebuilt the file
+        if calendar is None or mtime > calendar.built + 1:
+            metrics.CACHE_MISSES.inc(cache="visibility")
+            try:
+                calendar = _cache[path] = VisibilityCalendar.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load visibility calendar {path}: {e}")
+                return None
+        return calendar
+
+def ensure_calendars(runner, session_factory, sites):
+    """
+    Queues background builds for sites whose calendar is missing, has rolled too far
+    into the past or screens at a higher altitude than SCREEN_MIN_ALT (older files).
+    """
+    for site in sites:
+        calendar = get_calendar(session_factory, site)
+        tonight = night_of(time.time() / 86400.0 + fastsky.UNIX_EPOCH_JD, site["lon"])
+        if (calendar is None or tonight - calendar.first_night > REBUILD_AFTER_NIGHTS
+                or calendar.screen_alt > SCREEN_MIN_ALT):
+            runner.submit(f"visibility:{site_key(site)}", build_calendar, session_factory, site)
+
+def season_filter(planets, session_factory, sites, start_jd, end_jd, min_alt):
+    """
+    Drops planets whose host is out of season at every site for the whole window.
+    Sites without a calendar keep everything. Returns (kept planets, number skipped).
+    """
+    keep = np.zeros(len(planets), dtype=bool)
+    star_ids = [p.star_id for p in planets]
+    for site in sites:
+        calendar = get_calendar(session_factory, site)
+        if calendar is None:
+            return planets, 0
+        keep |= calendar.in_season(star_ids, start_jd, end_jd, min_alt)
+    kept = [p for p, k in zip(planets, keep) if k]
+    metrics.PREFILTER_REJECTED.inc(len(planets) - len(kept), reason="out_of_season")
+    return kept, len(planets) - len(kept)
+
+@register_refresh_hook
+def rebuild_visibility_calendars(session_factory, progress=None):
+    """Refresh hook: rebuilds every existing calendar of this database from the updated catalog."""
+    for path in sorted(glob.glob(os.path.join(VISIBILITY_DIR, f"{db_key(session_factory)}_*.npz"))):
+        try:
+            site = VisibilityCalendar.load(path).site
+        except (OSError, ValueError, KeyError):
+            continue
+        build_calendar(session_factory, site, progress=progress)
@@ -0,0 +1,258 @@
+"""
+Concurrent-session load test for the Streamlit app.
+
+Drives app/main.run headlessly with Streamlit's AppTest: every simulated
+session switches to the SQLite database, runs "Find Transits" and then
+selects a few result rows. Reports latency percentiles per action, peak RSS
+and the memory held per session. App exceptions, st.error messages and
+searches that store no result set fail the run.
+
+    python loadtest.py --sessions 8 --concurrency 4
+    python loadtest.py --sessions 4 --max-p95 30 --max-rss-mb 2500   # exit 1 on regression
+    python loadtest.py --sessions 4 --tracemalloc                     # heap retained per session
+"""
+import os
+import sys
+import gc
+import json
+import pickle
+import random
+import resource
+import tracemalloc
+import argparse
+import threading
+import multiprocessing
+import time as _time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+PERCENTILES = (50, 90, 95, 99)
+
+def current_rss_mb():
+    """Resident set size of this process (Linux /proc, falls back to the peak)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+class SimulatedSession:
+    """One browser session: its own AppTest (script run + session_state)."""
+
+    def __init__(self, number, data_source, search_date, hours, timeout):
+        self.number = number
+        self.data_source = data_source
+        self.search_date = search_date
+        self.hours = hours
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.timings = defaultdict(list)
+        self.errors = []
+
+    def _timed(self, action, func):
+        start = _time.perf_counter()
+        func()
+        self.timings[action].append(_time.perf_counter() - start)
+        # Handled failures (e.g. "Database Error") are st.error messages, not exceptions
+        self.errors.extend(f"{action}: {e.value}" for e in self.at.exception)
+        self.errors.extend(f"{action}: {e.value}" for e in self.at.error)
+
+    def run(self, searches, selections):
+        self._timed("load", self.at.run)
+        _widget(self.at.sidebar.radio, "Data Source").set_value(self.data_source)
+        _widget(self.at.date_input, "Observation Date").set_value(self.search_date)
+        _widget(self.at.number_input, "Window Duration (Hours)").set_value(self.hours)
+        self._timed("configure", self.at.run)
+
+        for _ in range(searches):
+            self._timed("search", lambda: _widget(self.at.button, "Find Transits").click().run())
+            if "result_set" not in self.at.session_state:
+                self.errors.append("search: no result set stored (search did not complete)")
+            n_rows = len(self.at.session_state["transits_data"]) if "transits_data" in self.at.session_state else 0
+            for _ in range(min(selections, n_rows)):
+                row = random.randrange(n_rows)
+                self.at.session_state["transit_table"] = {"selection": {"rows": [row], "columns": []}}
+                self._timed("select", self.at.run)
+        return self
+
+    def state_mb(self):
+        """Pickled size of what the session keeps between reruns (result set, filtered list, plan)."""
+        # One pickle, so records shared between the result set and the filtered list count once
+        state = [self.at.session_state[key] for key in ("result_set", "transits_data", "night_plan")
+                 if key in self.at.session_state and self.at.session_state[key] is not None]
+        return len(pickle.dumps(state)) / 2**20
+
+def summarize(timings):
+    stats = {}
+    for action, values in timings.items():
+        values = np.asarray(values)
+        stats[action] = {"count": len(values), "mean": float(values.mean()), "max": float(values.max())}
+        stats[action].update({f"p{q}": float(np.percentile(values, q)) for q in PERCENTILES})
+    return stats
+
+def _merge_timings(sims):
+    timings = defaultdict(list)
+    for sim in sims:
+        for action, values in sim.timings.items():
+            timings[action].extend(values)
+    return dict(timings)
+
+def _worker(slot, numbers, barrier, results, searches, selections, hours, data_source, vary_dates, timeout, seed,
+            trace=False):
+    """One worker process: warm-up, then its share of the sessions, run back to back and kept alive."""
+    random.seed(seed + slot)
+    try:
+        # Imports, DB engine, sky index and caches are process-wide, not per session
+        SimulatedSession(0, data_source, date.today(), hours, timeout).run(1, 0)
+        gc.collect()
+        baseline = current_rss_mb()
+        if trace:
+            tracemalloc.start()
+
+        barrier.wait()
+        sims = [SimulatedSession(n, data_source, date.today() + timedelta(days=n if vary_dates else 0), hours,
+                                 timeout) for n in numbers]
+        for sim in sims:
+            sim.run(searches, selections)
+        gc.collect()
+        heap = tracemalloc.get_traced_memory() if trace else (0, 0)
+        tracemalloc.stop()
+        results.put({
+            "timings": _merge_timings(sims),
+            "heap_mb": heap[0] / 2**20,
+            "heap_peak_mb": heap[1] / 2**20,
+            "baseline_rss_mb": baseline,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "state_mb": [sim.state_mb() for sim in sims],
+            "errors": [f"session {sim.number}: {e}" for sim in sims for e in sim.errors],
+        })
+    except Exception as e:
+        barrier.abort()
+        results.put({"timings": {}, "baseline_rss_mb": 0.0, "rss_mb": 0.0, "peak_rss_mb": peak_rss_mb(),
+                     "heap_mb": 0.0, "heap_peak_mb": 0.0, "state_mb": [], "errors": [f"worker {slot}: {e!r}"]})
+
+def run_load_test(sessions=4, concurrency=4, searches=1, selections=3, hours=168, data_source="SQLite",
+                  vary_dates=True, timeout=600, seed=0, trace=False):
+    """
+    AppTest patches global Streamlit state on every run and is not thread-safe,
+    so concurrent sessions run in `concurrency` worker processes that start
+    together after their warm-up. Each worker runs its sessions back to back.
+    trace: also measure the Python heap retained per session with tracemalloc
+           (exact, but slows every session down, so latencies are not comparable).
+    """
+    concurrency = max(1, min(concurrency, sessions))
+    # Workers would all try to bind the metrics port
+    os.environ["METRICS_PORT"] = "off"
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(concurrency + 1)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(slot, list(range(slot + 1, sessions + 1, concurrency)), barrier,
+                                                 results, searches, selections, hours, data_source, vary_dates,
+                                                 timeout, seed, trace))
+               for slot in range(concurrency)]
+
+    print(f"Warming up {concurrency} workers...")
+    for worker in workers:
+        worker.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass # A worker failed, its error is in the report
+    print(f"Running {sessions} sessions, {concurrency} at a time...")
+    started = _time.perf_counter()
+    reports = [results.get() for _ in workers]
+    wall = _time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    timings = defaultdict(list)
+    for r in reports:
+        for action, values in r["timings"].items():
+            timings[action].extend(values)
+    baseline = float(np.mean([r["baseline_rss_mb"] for r in reports]))
+    per_session = sum(max(r["rss_mb"] - r["baseline_rss_mb"], 0.0) for r in reports) / sessions
+
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "searches_per_min": 60.0 * sessions * searches / wall,
+        "latency_s": summarize(timings),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in reports),
+        "rss_per_session_mb": per_session,
+        # One Streamlit server holds every session in a single process
+        "estimated_server_rss_mb": baseline + sessions * per_session,
+        "heap_per_session_mb": sum(r["heap_mb"] for r in reports) / sessions if trace else None,
+        "heap_peak_mb": max(r["heap_peak_mb"] for r in reports) if trace else None,
+        "state_per_session_mb": float(np.mean([m for r in reports for m in r["state_mb"]] or [0.0])),
+        "errors": [e for r in reports for e in r["errors"]],
+    }
+
+def print_report(report):
+    print(f"\n{report['sessions']} sessions ({report['concurrency']} concurrent) in {report['wall_s']:.1f} s, "
+          f"{report['searches_per_min']:.1f} searches/min")
+    header = f"{'action':<10}{'count':>6}" + "".join(f"{'p' + str(q):>9}" for q in PERCENTILES) + f"{'max':>9}"
+    print(header)
+    for action, s in report["latency_s"].items():
+        print(f"{action:<10}{s['count']:>6}" + "".join(f"{s['p' + str(q)]:>8.2f}s" for q in PERCENTILES)
+              + f"{s['max']:>8.2f}s")
+    print(f"RSS per worker: baseline {report['baseline_rss_mb']:.0f} MB, peak {report['peak_rss_mb']:.0f} MB")
+    print(f"Per session: {report['rss_per_session_mb']:.1f} MB RSS, {report['state_per_session_mb'] * 1024:.0f} KB session state")
+    if report["heap_per_session_mb"] is not None:
+        print(f"Python heap (tracemalloc): {report['heap_per_session_mb']:.1f} MB retained per session, "
+              f"{report['heap_peak_mb']:.0f} MB peak per worker")
+    print(f"Estimated single-server RSS for {report['sessions']} sessions: {report['estimated_server_rss_mb']:.0f} MB")
+    for error in report["errors"]:
+        print(f"ERROR {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for ExoHunter Pro")
+    parser.add_argument("--sessions", type=int, default=4, help="Simulated browser sessions")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions running at the same time")
+    parser.add_argument("--searches", type=int, default=1, help="Searches per session")
+    parser.add_argument("--selections", type=int, default=3, help="Row selections after each search")
+    parser.add_argument("--hours", type=int, default=168, help="Search window (h)")
+    parser.add_argument("--data-source", default="SQLite", choices=["SQLite", "PostgreSQL"])
+    parser.add_argument("--same-date", action="store_true", help="All sessions search the same date")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-rerun timeout (s)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Measure retained heap per session (slower)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="Fail if p95 search latency (s) exceeds this")
+    parser.add_argument("--max-rss-mb", type=float, help="Fail if the estimated server RSS (MB) exceeds this")
+    args = parser.parse_args()
+
+    report = run_load_test(args.sessions, args.concurrency, args.searches, args.selections, args.hours,
+                           args.data_source, not args.same_date, args.timeout, trace=args.tracemalloc)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["errors"]:
+        failures.append(f"{len(report['errors'])} app errors")
+    search_p95 = report["latency_s"].get("search", {}).get("p95")
+    if args.max_p95 is not None and search_p95 is not None and search_p95 > args.max_p95:
+        failures.append(f"p95 search latency {search_p95:.2f} s > {args.max_p95} s")
+    if args.max_rss_mb is not None and report["estimated_server_rss_mb"] > args.max_rss_mb:
+        failures.append(f"estimated server RSS {report['estimated_server_rss_mb']:.0f} MB > {args.max_rss_mb} MB")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import pytest
+from app import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY = "start=2026-11-01T18:00:00&hours=8&min_alt=20&max_mag=13"
+
+@pytest.fixture
+def client(monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    if not os.path.exists(os.path.join(ROOT, "exoplanets.db")):
+        pytest.skip("bundled exoplanets.db not found")
+    from app import api
+
+    # The SQLite URL is relative; spawned workers inherit the working directory
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(api, "DATA_SOURCE", "SQLite")
+    api._results.clear()
+    with testclient.TestClient(api.app) as client:
+        yield client
+
+def test_pages_are_served_from_one_search(client):
+    misses = metrics.CACHE_MISSES.value(cache="api_results")
+    first = client.get(f"/search?{QUERY}&limit=2")
+    assert first.status_code == 200
+    total = first.json()["total"]
+    assert total > 2
+
+    second = client.get(f"/search?{QUERY}&limit=2&offset=2")
+    export = client.get(f"/search/export?{QUERY}")
+    assert second.json()["total"] == total
+    assert second.json()["items"][0] != first.json()["items"][0]
+    assert export.text.count("\n") == total + 1
+    assert metrics.CACHE_MISSES.value(cache="api_results") == misses + 1
+
+    client.get(f"/search?{QUERY}&min_alt=40")
+    assert metrics.CACHE_MISSES.value(cache="api_results") == misses + 2
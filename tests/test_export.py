@@ -0,0 +1,65 @@
+import io
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.export import results_frame, iter_export, export_bytes
+from app.scheduler import plan_nights
+from app.search import search_transits
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exoplanets.db")
+SITES = [{"name": "North", "lat": 48.088, "lon": 15.7566, "elevation": 300},
+         {"name": "South", "lat": -24.6, "lon": 19.8, "elevation": 1800}]
+
+@pytest.fixture(scope="module")
+def transits():
+    if not os.path.exists(DB_PATH):
+        pytest.skip("bundled exoplanets.db not found")
+    session_factory = sessionmaker(bind=create_engine(f"sqlite:///{DB_PATH}"))
+    start = datetime(2026, 11, 1)
+    found = search_transits(session_factory, start, start + timedelta(days=2), SITES, min_alt=20,
+                            max_mag=None, min_depth=None, aperture_in=8.0)
+    assert len(found) > 50
+    return found
+
+def assert_same_times(fast, slow):
+    assert list(fast.columns) == list(slow.columns)
+    for col in fast.columns:
+        if col.endswith("_bjd_tdb"):
+            np.testing.assert_allclose(fast[col], slow[col], rtol=0, atol=1e-8)
+        elif col.endswith(("_utc", "_local")):
+            assert (fast[col] - slow[col]).abs().max() <= pd.Timedelta("1ms"), col
+
+def test_time_columns_from_mid_jd_match_time_objects(transits):
+    # Without mid_jd the columns are built from the astropy Time objects of the records
+    legacy = [{k: v for k, v in t.items() if k != "mid_jd"} for t in transits]
+    assert_same_times(results_frame(transits, tz="Europe/Vienna"), results_frame(legacy, tz="Europe/Vienna"))
+
+def test_plan_blocks(transits):
+    plan = plan_nights(transits, longitude={s["name"]: s["lon"] for s in SITES})
+    frame = results_frame(plan, tz="UTC")
+    assert (frame["block_start_utc"] < frame["ingress_utc"]).all()
+    assert (frame["block_end_utc"] > frame["egress_utc"]).all()
+
+def test_csv_streams_in_chunks(transits):
+    frame = results_frame(transits, tz="UTC")
+    chunks = list(iter_export(frame, "CSV", chunksize=20))
+    assert len(chunks) == -(-len(frame) // 20)
+    assert b"".join(chunks) == frame.to_csv(index=False).encode("utf-8")
+
+def test_parquet_streams_row_groups(transits):
+    frame = results_frame(transits, tz="UTC")
+    chunks = list(iter_export(frame, "Parquet", chunksize=20))
+    assert len(chunks) > 2
+    restored = pd.read_parquet(io.BytesIO(b"".join(chunks)))
+    pd.testing.assert_frame_equal(restored, frame, check_dtype=False)
+
+def test_export_bytes_formats(transits):
+    assert pd.read_csv(io.BytesIO(export_bytes(transits, "CSV"))).shape[0] == len(transits)
+    assert pd.read_excel(io.BytesIO(export_bytes(transits[:20], "XLSX"))).shape[0] == 20
+    assert export_bytes(transits[:3], "N.I.N.A JSON").startswith(b"{")
+    with pytest.raises(ValueError):
+        export_bytes(transits, "PDF")
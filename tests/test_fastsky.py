@@ -0,0 +1,76 @@
+import os
+import numpy as np
+import pytest
+from astropy.time import Time
+from astropy.coordinates import SkyCoord, get_body
+import astropy.units as u
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import fastsky
+from app.models import Star
+from app.search import query_candidates
+from app.logic import get_observer, calculate_transits_multi_site
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exoplanets.db")
+
+SITES = [
+    ("Home", 48.088, 15.7566, 300),
+    ("La Silla", -29.257, -70.738, 2400),
+    ("Mauna Kea", 19.826, -155.472, 4200),
+    ("Equator", 0.0, 100.0, 0),
+]
+TIMES = Time(["2021-03-20T22:00:00", "2026-10-19T03:30:00", "2030-06-21T12:00:00", "2034-12-31T18:45:00"], scale="utc")
+
+@pytest.fixture(scope="module")
+def session_factory():
+    if not os.path.exists(DB_PATH):
+        pytest.skip("bundled exoplanets.db not found")
+    return sessionmaker(bind=create_engine(f"sqlite:///{DB_PATH}"))
+
+@pytest.fixture(scope="module")
+def catalog(session_factory):
+    db = session_factory()
+    try:
+        rows = db.query(Star.ra, Star.dec).filter(Star.ra.isnot(None), Star.dec.isnot(None)).all()
+    finally:
+        db.close()
+    ra, dec = np.array(rows, dtype=float).T
+    return ra, dec
+
+@pytest.mark.parametrize("name, lat, lon, elevation", SITES)
+def test_target_altitude_within_error_bound(catalog, name, lat, lon, elevation):
+    ra, dec = catalog
+    observer = get_observer(lat, lon, elevation, name=name)
+    targets = SkyCoord(ra=ra * u.deg, dec=dec * u.deg)
+    for t in TIMES:
+        exact = observer.altaz(t, targets).alt.deg
+        fast = fastsky.target_altitude(ra, dec, t.utc.jd, lat, lon)
+        assert np.max(np.abs(fast - exact)) < fastsky.ERROR_BOUND_DEG
+
+@pytest.mark.parametrize("name, lat, lon, elevation", SITES)
+def test_sun_altitude_within_error_bound(name, lat, lon, elevation):
+    observer = get_observer(lat, lon, elevation, name=name)
+    times = Time("2020-01-01T00:00:00", scale="utc") + np.linspace(0.0, 15 * 365.25, 400) * u.day
+    exact = observer.altaz(times, get_body("sun", times)).alt.deg
+    fast = fastsky.sun_altitude(times.utc.jd, lat, lon)
+    assert np.max(np.abs(fast - exact)) < fastsky.ERROR_BOUND_DEG
+
+def test_screen_does_not_change_transit_results(session_factory, monkeypatch):
+    db = session_factory()
+    try:
+        planets = query_candidates(db, max_mag=13.0)
+    finally:
+        db.close()
+    observers = [get_observer(lat, lon, elevation, name=name) for name, lat, lon, elevation in SITES[:2]]
+    start = Time("2026-10-19T12:00:00", scale="utc")
+    end = start + 3 * u.day
+
+    def run():
+        transits = calculate_transits_multi_site(planets, start, end, observers, min_alt=30, aperture_in=8.0)
+        return sorted((t["planet_name"], t["site"], t["epoch"], round(float(t["altitude"]), 9)) for t in transits)
+
+    screened = run()
+    monkeypatch.setattr(fastsky, "screen", lambda ra, *args, **kwargs: np.ones(np.shape(ra), dtype=bool))
+    unscreened = run()
+    assert screened
+    assert screened == unscreened
@@ -0,0 +1,34 @@
+import threading
+import time
+from app.jobs import JobRunner, refresh_job
+
+def wait_for(runner, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while runner.status(job_id)["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, f"job {job_id} did not finish"
+        time.sleep(0.01)
+    return runner.status(job_id)
+
+def test_refresh_of_another_data_source_is_not_swallowed():
+    runner = JobRunner()
+    release = threading.Event()
+    ran = []
+
+    def fake_refresh(data_source, progress=None):
+        release.wait(5)
+        ran.append(data_source)
+
+    try:
+        postgres = runner.submit(refresh_job("PostgreSQL"), fake_refresh, data_source="PostgreSQL")
+        sqlite = runner.submit(refresh_job("SQLite"), fake_refresh, data_source="SQLite")
+        # A second click for the same database joins the queued/running job
+        assert runner.submit(refresh_job("SQLite"), fake_refresh, data_source="SQLite") == sqlite
+        assert sqlite != postgres
+        release.set()
+        assert wait_for(runner, postgres)["status"] == "done"
+        assert wait_for(runner, sqlite)["status"] == "done"
+        assert ran == ["PostgreSQL", "SQLite"]
+        assert runner.latest(refresh_job("SQLite"))["id"] == sqlite
+    finally:
+        release.set()
+        runner.shutdown()
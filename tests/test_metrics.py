@@ -0,0 +1,66 @@
+import os
+import re
+import urllib.request
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import metrics
+from app.search import search_transits
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exoplanets.db")
+SITE = {"name": "Home", "lat": 48.088, "lon": 15.7566, "elevation": 300}
+
+def sample(text, line_start):
+    """Value of the first exposition line starting with line_start, or None."""
+    match = re.search(rf"^{re.escape(line_start)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+@pytest.fixture(scope="module")
+def server():
+    server = metrics.start_metrics_server(port=0, addr="127.0.0.1")
+    if server is None:
+        pytest.skip("metrics server could not be started")
+    return server
+
+def scrape(server):
+    host, port = server.server_address[:2]
+    with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+        assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+        return response.read().decode("utf-8")
+
+def test_scrape_after_search(server):
+    if not os.path.exists(DB_PATH):
+        pytest.skip("bundled exoplanets.db not found")
+    session_factory = sessionmaker(bind=create_engine(f"sqlite:///{DB_PATH}"))
+    before = metrics.SEARCH_SECONDS.count(source="service")
+    start = datetime(2026, 10, 19, 12)
+    search_transits(session_factory, start, start + timedelta(hours=24), [SITE], max_mag=12.0)
+    metrics.FETCH_FAILURES.inc(source="test")
+
+    text = scrape(server)
+    assert sample(text, 'exohunter_search_seconds_bucket{source="service",le="+Inf"}') == before + 1
+    assert sample(text, 'exohunter_search_seconds_count{source="service"}') == before + 1
+    assert sample(text, 'exohunter_search_candidates_count{source="service"}') >= 1
+    assert sample(text, 'exohunter_cache_lookups_total{cache="sky_index"}') >= 1
+    assert sample(text, 'exohunter_source_fetch_failures_total{source="test"}') == 1
+    assert sample(text, 'exohunter_db_connections_opened_total{dialect="sqlite3"}') >= 1
+
+def test_unknown_path_is_404(server):
+    host, port = server.server_address[:2]
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://{host}:{port}/other", timeout=5)
+    assert error.value.code == 404
+
+def test_api_metrics_endpoint():
+    testclient = pytest.importorskip("fastapi.testclient")
+    from app.api import app
+
+    metrics.SEARCH_EVENTS.observe(3, source="api")
+    with testclient.TestClient(app) as client:
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    assert "# TYPE exohunter_api_request_seconds histogram" in response.text
+    assert sample(response.text, 'exohunter_search_events_count{source="api"}') >= 1
+    assert 'exohunter_search_events_bucket{source="api",le="10.0"}' in response.text
@@ -0,0 +1,100 @@
+import json
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from app.nina import NinaClient, ADD_TARGET_PATH
+
+TIMEOUT = 0.5
+
+class StubNina(BaseHTTPRequestHandler):
+    """Mimics POST /api/v1/targets/add. The target name selects the behaviour:
+    SLOW-* answers after the client timeout, FAIL-* returns 503, BAD-* returns 400."""
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        name = payload["Name"]
+        with server.lock:
+            server.posts[name] += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path != ADD_TARGET_PATH:
+                code = 404
+            elif name.startswith("SLOW-"):
+                time.sleep(TIMEOUT * 3)
+                code = 200
+            elif name.startswith("FAIL-"):
+                code = 503
+            elif name.startswith("BAD-"):
+                code = 400
+            else:
+                time.sleep(0.05) # long enough for requests to overlap
+                code = 200
+        finally:
+            with server.lock:
+                server.active -= 1
+        body = json.dumps({"Success": code == 200}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubNina)
+    server.lock = threading.Lock()
+    server.posts = Counter()
+    server.active = server.max_active = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def transit(name):
+    return {"planet_name": name, "ra": 97.6366, "dec": 29.6722}
+
+def client_for(server, **kwargs):
+    return NinaClient("127.0.0.1", server.server_address[1], timeout=TIMEOUT, **kwargs)
+
+def test_push_targets_keeps_input_order(stub):
+    names = ["WASP-12b", "BAD-1b", "HAT-P-7b", "KELT-9b", "BAD-2b", "TrES-3b"]
+    with client_for(stub, max_workers=3) as client:
+        statuses = client.push_targets([transit(n) for n in names])
+    assert [s["name"] for s in statuses] == names
+    assert [s["ok"] for s in statuses] == [not n.startswith("BAD-") for n in names]
+    assert statuses[1]["status_code"] == 400
+
+def test_concurrency_is_bounded_by_max_workers(stub):
+    progress = []
+    with client_for(stub, max_workers=3) as client:
+        statuses = client.push_targets([transit(f"T-{i}b") for i in range(12)],
+                                       progress=lambda done, total: progress.append((done, total)))
+    assert all(s["ok"] for s in statuses)
+    assert 1 < stub.max_active <= 3
+    assert progress[-1] == (12, 12)
+
+@pytest.mark.parametrize("name", ["SLOW-1b", "FAIL-1b"])
+def test_slow_or_failing_server_gets_exactly_one_post(stub, name):
+    with client_for(stub, retries=2) as client:
+        status = client.push_target(transit(name))
+    time.sleep(TIMEOUT * 3) # let a (wrong) retry reach the stub
+    assert not status["ok"]
+    assert status["error"]
+    assert stub.posts[name] == 1
+
+def test_refused_connection_is_reported_not_raised():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with NinaClient("127.0.0.1", port, timeout=TIMEOUT, retries=1) as client:
+        statuses = client.push_targets([transit("WASP-12b"), transit("HAT-P-7b")])
+    assert [s["ok"] for s in statuses] == [False, False]
+    assert all(s["status_code"] is None and s["error"] for s in statuses)
@@ -0,0 +1,62 @@
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from astropy.time import Time
+import astropy.units as u
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import fastsky, search
+from app.logic import get_observer, calculate_transits_multi_site
+from app.sky_index import SkyIndex, prefilter_candidates
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exoplanets.db")
+LAT, LON = -24.6, 19.8
+
+def evening_twilight(date):
+    """UTC JD at which the sun sinks below -6 deg at the test site on the evening of date."""
+    jd = Time(f"{date}T12:00:00").jd + np.arange(0.0, 0.5, 1.0 / 86400.0)
+    return jd[np.argmax(fastsky.sun_altitude(jd, LAT, LON) <= -6.0)]
+
+def keys(transits):
+    return {(t["planet_name"], t["site"], t["epoch"]) for t in transits}
+
+def test_setting_star_just_after_twilight_is_kept():
+    # Window starts a minute before the -6 deg crossing, so the first sample is too bright
+    # and the next one is half an hour later, when the setting host is far below 30 deg.
+    twilight = evening_twilight("2026-11-15")
+    start = Time(twilight - 1.0 / 1440.0, format="jd", scale="utc")
+    mid = twilight + 1.5 / 1440.0
+    ra = np.arange(0.0, 360.0, 0.01)
+    alt = fastsky.target_altitude(ra, np.zeros_like(ra), np.full_like(ra, mid), LAT, LON)
+    west = (fastsky.gmst_deg(np.array([mid])) + LON - ra) % 360.0 < 180.0
+    star_ra = float(ra[np.flatnonzero(west & (np.abs(alt - 30.5) < 0.01))[0]])
+
+    planet = SimpleNamespace(name="Edge b", star_id=1, ra=star_ra, dec=0.0, mag_v=10.0, period=50.0,
+                             t0=Time(mid, format="jd", scale="utc").tdb.jd, duration=2.0, depth_mmag=10.0,
+                             priority="high", t0_err=0.0, period_err=0.0, min_telescope_in=0.0)
+    observers = [get_observer(LAT, LON, 1800, name="South")]
+    end = start + 3 * u.hour
+    found = calculate_transits_multi_site([planet], start, end, observers, min_alt=30)
+    assert len(found) == 1 and found[0]["sun_alt"] < -6.0
+
+    kept, out_of_sky, _ = prefilter_candidates([planet], SkyIndex([1], [star_ra], [0.0]), observers, start, end,
+                                               min_alt=30)
+    assert kept == [planet] and out_of_sky == 0
+
+@pytest.mark.parametrize("date", ["2026-11-15", "2027-03-02", "2027-06-21"])
+def test_prefilter_does_not_change_search_at_twilight(date, monkeypatch):
+    if not os.path.exists(DB_PATH):
+        pytest.skip("bundled exoplanets.db not found")
+    session_factory = sessionmaker(bind=create_engine(f"sqlite:///{DB_PATH}"))
+    start = Time(evening_twilight(date) - 10.0 / 1440.0, format="jd", scale="utc").to_datetime()
+    sites = [{"name": "South", "lat": LAT, "lon": LON, "elevation": 1800}]
+
+    def run():
+        return search.search_transits(session_factory, start, start + timedelta(hours=3), sites, min_alt=30)
+
+    with_prefilter = run()
+    assert with_prefilter
+    monkeypatch.setattr(search, "prefilter_candidates", lambda planets, *args, **kwargs: (planets, 0, 0))
+    assert keys(with_prefilter) == keys(run())